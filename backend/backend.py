@@ -1,12 +1,89 @@
 #!/usr/bin/env python3
-from fastapi import FastAPI, HTTPException
-import sqlite3
-from datetime import datetime
-from pydantic import BaseModel
-from typing import Optional, List
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+import json
+import logging
+import os
+import sys
+import time
+from pydantic import VERSION as PYDANTIC_VERSION, BaseModel, conlist
+from typing import AsyncIterator, Callable, Optional, List, Sequence
 
-app = FastAPI()
-DB_PATH = "../data/earphones_store.db"
+# orjson is optional; responses fall back to the standard JSON encoder
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+# rasa 3.6 pins pydantic 1.10; the models below also work under pydantic 2
+PYDANTIC_V2 = PYDANTIC_VERSION.startswith("2.")
+
+def bounded_list(item_type, max_items: int):
+    """List type that rejects more than max_items items"""
+    if PYDANTIC_V2:
+        return conlist(item_type, max_length=max_items)
+    return conlist(item_type, max_items=max_items)
+
+def to_json(model: BaseModel) -> str:
+    return model.model_dump_json() if PYDANTIC_V2 else model.json()
+
+# Share the connection pool with the action server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "earphones_chatbot"))
+from actions import metrics
+from actions.db import close_pool, fetch_all, get_pool, run_db
+from actions.cache import get_product_cache, normalize_terms
+from actions.pricing import parse_price_range
+from actions.orders import fetch_order, fetch_orders, resolve_user_id
+from actions.queries import PRODUCTS_BY_IDS, product_filter
+from actions.search import build_match_query, normalize_brand, parse_tag_terms
+from actions.snapshot import SNAPSHOT_ENABLED, close_snapshots, get_read_pool, get_snapshots
+from actions.writes import WriteQueueFull, close_complaint_writer, get_complaint_writer
+
+logger = logging.getLogger(__name__)
+
+# `python backend.py` serves the API with this many worker processes, each
+# with its own connection pool and caches
+HOST = os.environ.get("BACKEND_HOST", "0.0.0.0")
+PORT = int(os.environ.get("BACKEND_PORT", "8001"))
+WORKERS = int(os.environ.get("BACKEND_WORKERS", str(os.cpu_count() or 1)))
+
+# Batch endpoints: most items per request, and items per query. Batches
+# bigger than one chunk (or requested with Accept: application/x-ndjson)
+# are streamed back as NDJSON, one chunk at a time
+MAX_BATCH = int(os.environ.get("BACKEND_MAX_BATCH", "10000"))
+BATCH_CHUNK = int(os.environ.get("BACKEND_BATCH_CHUNK", "500"))
+NDJSON = "application/x-ndjson"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pool (and its DB thread pool) before the first request
+    get_pool()
+    get_read_pool()
+    yield
+    close_complaint_writer()
+    close_snapshots()
+    close_pool()
+
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultResponse)
+
+async def record_request_time(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - start, request.method,
+                                     getattr(route, "path", "unmatched"), status)
+
+# Only wrap requests when metrics are on, so switching them off costs nothing
+if metrics.ENABLED:
+    app.middleware("http")(record_request_time)
 
 # Pydantic models for request/response validation
 class ProductSearch(BaseModel):
@@ -26,115 +103,214 @@ class ComplaintCreate(BaseModel):
     topic: str
     description: str
 
+class OrderStatusBatchRequest(BaseModel):
+    orders: bounded_list(OrderStatusRequest, MAX_BATCH)
+
+class ProductBatchRequest(BaseModel):
+    ids: bounded_list(int, MAX_BATCH)
+
+# Response models; field order matches the column order of the rows they wrap
+class Product(BaseModel):
+    id: int
+    name: str
+    brand: str
+    price: float
+    stock: int
+    rating: float
+    features: str
+
+class ProductList(BaseModel):
+    products: List[Product]
+
+class OrderStatus(BaseModel):
+    order_id: int
+    user_id: int
+    shipping_address: str
+    order_amount: float
+    status: str
+    created_time: Optional[str]
+
+class ComplaintCreated(BaseModel):
+    complaint_id: int
+
+# Batch results keep the request's order; order/product is null when not found
+class OrderLookup(BaseModel):
+    order_id: int
+    order: Optional[OrderStatus] = None
+
+class OrderBatch(BaseModel):
+    results: List[OrderLookup]
+
+class ProductLookup(BaseModel):
+    id: int
+    product: Optional[Product] = None
+
+class ProductBatch(BaseModel):
+    results: List[ProductLookup]
+
+def field_names(model) -> List[str]:
+    """Field names of a model class, in declaration order"""
+    return list(model.model_fields if PYDANTIC_V2 else model.__fields__)
+
+# Per model class, so rows are mapped without walking the class each time
+_FIELD_NAMES = {model: field_names(model) for model in (Product, OrderStatus)}
+
+def from_row(model, row):
+    """Model instance from a DB row whose columns follow the model's fields"""
+    names = _FIELD_NAMES.get(model) or field_names(model)
+    return model(**dict(zip(names, row)))
+
 # Database helper functions
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    """Borrow a pooled database connection (use as a context manager)"""
+    return get_pool().connection()
 
-@app.post("/search_products")
-def search_products(criteria: ProductSearch):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    base_query = "SELECT * FROM products WHERE 1=1"
-    params = []
-    
-    if criteria.query:
-        base_query += " AND (name LIKE ? OR brand LIKE ? OR tags LIKE ?)"
-        params.extend([f"%{criteria.query}%", f"%{criteria.query}%", f"%{criteria.query}%"])
-    
-    if criteria.brand and criteria.brand.lower() != "any":
-        base_query += " AND LOWER(brand) LIKE ?"
-        params.append(f"%{criteria.brand.lower()}%")
-    
-    if criteria.price_range:
-        # Price range parsing logic (same as original)
-        pass  # Implement your price parsing logic here
-    
-    if criteria.product_type and criteria.product_type.lower() != "any":
-        base_query += " AND tags LIKE ?"
-        params.append(f"%{criteria.product_type.lower()}%")
-    
-    if criteria.features and criteria.features.lower() != "any":
-        # Features processing logic (same as original)
-        pass  # Implement your features logic here
-    
-    base_query += " ORDER BY rating DESC LIMIT 5"
-    cursor.execute(base_query, params)
-    results = cursor.fetchall()
-    conn.close()
+def get_catalog_connection():
+    """Borrow a connection for product reads (the read snapshot when enabled)"""
+    return get_read_pool().connection()
+
+@app.get("/db_stats")
+def db_stats():
+    return get_pool().stats()
+
+@app.get("/cache_stats")
+def cache_stats():
+    return get_product_cache().stats()
+
+@app.get("/write_stats")
+def write_stats():
+    return get_complaint_writer().stats()
+
+@app.get("/snapshot_stats")
+def snapshot_stats():
+    if not SNAPSHOT_ENABLED:
+        raise HTTPException(status_code=404, detail="Read snapshot is disabled")
+    return get_snapshots().stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def _normalized(value: Optional[str]) -> Optional[str]:
+    if not value or value.strip().lower() == "any":
+        return None
+    return value.strip().lower()
+
+def search_key_for(criteria: ProductSearch):
+    """Cache key for normalized search criteria"""
+    return (
+        "api_search",
+        normalize_terms(criteria.query),
+        _normalized(normalize_brand(criteria.brand)),
+        parse_price_range(criteria.price_range),
+        tuple(sorted(parse_tag_terms(criteria.product_type, criteria.features))),
+    )
+
+def query_products(criteria: ProductSearch):
+    """Uncached product search"""
+    match = build_match_query(criteria.query) if criteria.query else None
+    price = parse_price_range(criteria.price_range)
+    sql, params = product_filter(
+        match,
+        normalize_brand(criteria.brand),
+        None if price.is_open else price.sql_bounds(),
+        parse_tag_terms(criteria.product_type, criteria.features),
+        limit=5,
+    )
+    with get_catalog_connection() as conn:
+        return fetch_all(conn, sql, params)
+
+@app.post("/search_products", response_model=ProductList)
+async def search_products(criteria: ProductSearch):
+    # A query with no searchable words ('"*', "!!!") matches nothing, and
+    # must not fall through to the unfiltered listing (or share its cache key)
+    if criteria.query and criteria.query.strip() and build_match_query(criteria.query) is None:
+        return ProductList(products=[])
+    # The cache lookup may itself read the DB (invalidation), so it runs off the loop too
+    results = await run_db(get_product_cache().get_or_compute, search_key_for(criteria),
+                           lambda: tuple(query_products(criteria)))
     
-    return {
-        "products": [
-            {
-                "id": row[0],
-                "name": row[1],
-                "brand": row[2],
-                "price": row[3],
-                "stock": row[4],
-                "rating": row[5],
-                "features": row[6]
-            }
-            for row in results
-        ]
-    }
-
-@app.get("/order_status")
-def get_order_status(order_id: int, email: str):
-    print(email, "@".join(email.split("ATSYMB")))
+    return ProductList(products=[from_row(Product, row) for row in results])
+
+def lookup_order(order_id: int, email: str):
+    with get_connection() as conn:
+        return fetch_order(conn, order_id, email)
+
+@app.get("/order_status", response_model=OrderStatus)
+async def get_order_status(order_id: int, email: str):
     # email = "@".join(email.split("ATSYMB"))
-    conn = get_connection()
-    cursor = conn.cursor()
+    result = await run_db(lookup_order, order_id, "@".join(email.split("ATSYMB")))
     
-    cursor.execute("""
-    SELECT o.*, u.name, u.email 
-    FROM orders o 
-    JOIN users u ON o.user_id = u.id 
-    WHERE o.id = ? AND u.email = ?
-    """, (order_id, "@".join(email.split("ATSYMB"))))
-    
-    
-    result = cursor.fetchone()
-    print(result)
-    conn.close()
+    metrics.log_sampled(logger, "order_status", order_id=order_id, found=result is not None)
     
     if not result:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return {
-        "order_id": result[0],
-        "user_id": result[1],
-        "shipping_address": result[2],
-        "order_amount": result[3],
-        "status": result[4],
-        "created_time": result[5]
-    }
-
-@app.post("/create_complaint")
-def create_complaint(complaint: ComplaintCreate):
-    conn = get_connection()
-    cursor = conn.cursor()
+    return from_row(OrderStatus, result)
+
+def lookup_orders(items: Sequence[OrderStatusRequest]):
+    pairs = [(item.order_id, "@".join(item.email.split("ATSYMB"))) for item in items]
+    with get_connection() as conn:
+        return fetch_orders(conn, pairs)
+
+def lookup_products(ids):
+    """Product rows for ids (one query), aligned with the input"""
+    with get_catalog_connection() as conn:
+        rows = fetch_all(conn, PRODUCTS_BY_IDS, (json.dumps(list(set(ids))),))
+    by_id = {row[0]: row for row in rows}
+    return [by_id.get(product_id) for product_id in ids]
+
+async def lookup_chunks(items: Sequence, lookup: Callable, build: Callable) -> AsyncIterator[List[BaseModel]]:
+    """Run a batch lookup BATCH_CHUNK items (one query) at a time"""
+    for start in range(0, len(items), BATCH_CHUNK):
+        chunk = items[start:start + BATCH_CHUNK]
+        rows = await run_db(lookup, chunk)
+        yield [build(item, row) for item, row in zip(chunk, rows)]
+
+async def batch_response(request: Request, items: Sequence, lookup: Callable, build: Callable, model):
+    """NDJSON stream for large batches or when asked for, else one JSON body"""
+    chunks = lookup_chunks(items, lookup, build)
+    if len(items) > BATCH_CHUNK or NDJSON in request.headers.get("accept", ""):
+        async def lines():
+            async for results in chunks:
+                yield "".join(to_json(result) + "\n" for result in results)
+        return StreamingResponse(lines(), media_type=NDJSON)
+    return model(results=[result async for results in chunks for result in results])
+
+def order_lookup(item: OrderStatusRequest, row) -> OrderLookup:
+    return OrderLookup(order_id=item.order_id, order=from_row(OrderStatus, row) if row else None)
+
+def product_lookup(product_id: int, row) -> ProductLookup:
+    return ProductLookup(id=product_id, product=from_row(Product, row) if row else None)
+
+@app.post("/order_status/batch", response_model=OrderBatch)
+async def get_order_status_batch(batch: OrderStatusBatchRequest, request: Request):
+    return await batch_response(request, batch.orders, lookup_orders, order_lookup, OrderBatch)
+
+@app.post("/products/batch", response_model=ProductBatch)
+async def get_products_batch(batch: ProductBatchRequest, request: Request):
+    return await batch_response(request, batch.ids, lookup_products, product_lookup, ProductBatch)
+
+def lookup_user_id(email: str) -> Optional[int]:
+    with get_connection() as conn:
+        return resolve_user_id(conn, email)
+
+@app.post("/create_complaint", response_model=ComplaintCreated)
+async def create_complaint(complaint: ComplaintCreate):
+    user_id = await run_db(lookup_user_id, complaint.user_email)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
+    # Group-committed with other complaints arriving within a few ms
     try:
-        cursor.execute("SELECT id FROM users WHERE email = ?", (complaint.user_email,))
-        user_result = cursor.fetchone()
-        
-        if not user_result:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        user_id = user_result[0]
-        created_at = datetime.now()
-        
-        cursor.execute("""
-        INSERT INTO complaints (order_id, user_id, status, topic, description, created_at)
-        VALUES (?, ?, 'open', ?, ?, ?)
-        """, (complaint.order_id, user_id, complaint.topic, complaint.description, created_at))
-        
-        conn.commit()
-        complaint_id = cursor.lastrowid
-        return {"complaint_id": complaint_id}
-    
-    finally:
-        conn.close()
+        complaint_id = await get_complaint_writer().submit_async(
+            complaint.order_id, user_id, complaint.topic, complaint.description)
+    except WriteQueueFull:
+        raise HTTPException(status_code=503, detail="Too many complaints queued, retry shortly")
+    return ComplaintCreated(complaint_id=complaint_id)
 
-# if __name__ == "__main__":
-#     app()
\ No newline at end of file
+if __name__ == "__main__":
+    import uvicorn
+    
+    uvicorn.run("backend:app", host=HOST, port=PORT, workers=WORKERS,
+                app_dir=os.path.dirname(os.path.abspath(__file__)))
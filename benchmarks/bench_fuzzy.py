@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the typo-tolerant product index
+Builds the deletion index over a synthetic catalog, then times misspelled
+lookups and an incremental update of a slice of the catalog
+
+Usage (from the repo root):
+    python benchmarks/bench_fuzzy.py --products 100000 --lookups 2000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+from actions.fuzzy import FuzzyIndex  # noqa: E402
+
+BRANDS = ("Sony", "Apple", "Bose", "Sennheiser", "JBL", "Audio-Technica", "Beats",
+          "Jabra", "Samsung", "Anker", "Skullcandy", "Shure", "Beyerdynamic", "Marshall")
+LINES = ("QuietComfort", "Momentum", "AirPods", "Galaxy Buds", "Elite", "Soundcore Liberty",
+         "Studio", "Crusher", "Aonic", "Major", "Tune", "Live", "Flex", "Sport", "Pro",
+         "Wireless", "Noise Cancelling", "True Wireless", "Headphones", "Earbuds")
+TYPOS = ("senheiser", "airpod", "bose qc35", "wirelss", "quietcomfrot", "skulcandy",
+         "beyerdinamic", "galaxy bud", "noise canceling", "jabra elit", "audio technika",
+         "marshal major", "soundcor liberty", "momentun", "crushr")
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(1, n + 1):
+        brand = rng.choice(BRANDS)
+        name = f"{brand} {rng.choice(LINES)} {rng.choice(LINES)} {rng.choice('ABCDEFGHX')}{i}"
+        rows.append((i, name, brand, round(rng.uniform(20, 500), 2), rng.randint(0, 200),
+                     round(rng.uniform(3, 5), 1), "wireless"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--changes", type=int, default=1000, help="rows edited for the update")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    rows = make_rows(args.products, rng)
+    index = FuzzyIndex()
+    start = time.perf_counter()
+    index.apply(rows)
+    print(f"built index over {args.products} products in {time.perf_counter() - start:.2f}s "
+          f"{index.stats()}")
+
+    # Time the lookup itself; refresh() would poll the products database
+    index.refresh = lambda: None
+    latencies = []
+    for n in range(args.lookups):
+        start = time.perf_counter()
+        index.search(TYPOS[n % len(TYPOS)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    print(f"typo lookups: p50 {cuts[49]:.3f} ms  p95 {cuts[94]:.3f} ms  p99 {cuts[98]:.3f} ms")
+    for query in TYPOS[:5]:
+        print(f"    {query!r:<16} -> {[r[1] for r in index.search(query, 3)]}")
+
+    for i in rng.sample(range(len(rows)), args.changes):
+        product_id, name, brand, price, stock, rating, tags = rows[i]
+        rows[i] = (product_id, f"{brand} {rng.choice(LINES)} {product_id}", brand, price,
+                   stock, round(rng.uniform(3, 5), 1), tags)
+    start = time.perf_counter()
+    changed = index.apply(rows)
+    print(f"incremental update of {changed} rows: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark for change_log based cache invalidation
+Copies a database (adding the change_log triggers), then runs a steady
+writer process updating product prices and stock while this process
+serves product searches through the shared product cache. Reports the
+invalidation lag (commit -> the watcher reporting the change) and the
+cache hit ratio with targeted invalidation and with whole-cache drops.
+
+Usage (from the repo root):
+    python benchmarks/bench_invalidation.py --db data/earphones_large.db --writes-per-second 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+TERMS = ("sony", "bose", "wireless", "noise", "sport", "apple airpods", "jbl", "sennheiser",
+         "gaming", "bass", "beats", "budget", "premium", "earbuds", "over ear")
+
+
+def writer(db_path, rate, duration, product_ids, seed, out):
+    """Update one product per tick; report (change version, commit time)"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    end = time.time() + duration
+    tick = 1.0 / rate
+    while time.time() < end:
+        product_id = rng.choice(product_ids)
+        with conn:
+            conn.execute("UPDATE products SET price = round(price * ?, 2), quantity = ? "
+                         "WHERE id = ?", (rng.uniform(0.95, 1.05), rng.randint(0, 100), product_id))
+            version = conn.execute("SELECT max(version) FROM change_log").fetchone()[0]
+        out.put((version, time.time()))
+        time.sleep(tick)
+    out.put(None)
+    conn.close()
+
+
+def run(db_path, args, targeted):
+    from actions import cache, db
+    from actions.search import search_products_fulltext
+
+    db._watcher = db.ChangeWatcher(db_path, interval=args.interval)
+    product_cache = cache.ResultCache(
+        table="products", on_change=cache.product_entry_filter if targeted else None)
+    pool = db.get_pool()
+    with pool.connection() as conn:
+        product_ids = [r[0] for r in conn.execute("SELECT id FROM products")]
+
+    out = multiprocessing.Queue()
+    proc = multiprocessing.Process(
+        target=writer, args=(db_path, args.writes_per_second, args.duration,
+                             product_ids, args.seed, out))
+    rng = random.Random(args.seed)
+    commits = {}
+    seen = []   # (products version, time it was first seen)
+    last = None
+    proc.start()
+    done = False
+    while not done or proc.is_alive():
+        term = rng.choice(TERMS)
+
+        def compute():
+            with pool.connection() as conn:
+                return tuple(search_products_fulltext(conn, term))
+
+        product_cache.get_or_compute(cache.search_key(term, 5), compute)
+        version = db._watcher.version()
+        if version != last:
+            seen.append((version, time.time()))
+            last = version
+        while not out.empty():
+            item = out.get()
+            if item is None:
+                done = True
+            else:
+                commits[item[0]] = item[1]
+        time.sleep(args.think_ms / 1000)
+    proc.join()
+
+    # Lag of each commit: until the first version at or past it was seen
+    lags = []
+    for version, committed in commits.items():
+        detected = next((t for v, t in seen if v >= version), None)
+        if detected is not None:
+            lags.append((detected - committed) * 1000)
+    stats = product_cache.stats()
+    return lags, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=os.path.join(ROOT, "data", "earphones_store.db"))
+    parser.add_argument("--writes-per-second", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of writes per run")
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="watcher poll interval (EARPHONES_DB_WATCH_INTERVAL)")
+    parser.add_argument("--think-ms", type=float, default=1.0, help="pause between searches")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import setup_database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(args.db, db_path)
+        setup_database.migrate_database(db_path)
+        os.environ["EARPHONES_DB_PATH"] = db_path
+
+        for targeted in (True, False):
+            lags, stats = run(db_path, args, targeted)
+            label = "targeted" if targeted else "drop all"
+            cuts = statistics.quantiles(lags, n=100, method="inclusive") if len(lags) > 1 else [0] * 99
+            print(f"{label:<9} {len(lags)} writes: lag p50 {cuts[49]:.1f} ms  "
+                  f"p95 {cuts[94]:.1f} ms  max {max(lags, default=0):.1f} ms | "
+                  f"hit ratio {stats['hit_ratio']:.3f} (dropped {stats['dropped']}, "
+                  f"full drops {stats['invalidations']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the structured-input NLU bypass
+Runs the StructuredMatcher over the NLU training examples (plus synthetic
+order IDs and emails) and reports how many messages bypass the models,
+whether the bypass intent agrees with the annotation, and the matcher's
+cost per message. With --rasa-url it also times /model/parse on a running
+Rasa server for bypassed and model-classified messages.
+
+Usage (from the repo root):
+    python benchmarks/bench_nlu_bypass.py
+    python benchmarks/bench_nlu_bypass.py --rasa-url http://localhost:5005
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+from components.matcher import StructuredMatcher  # noqa: E402
+
+NLU_PATH = os.path.join(ROOT, "earphones_chatbot", "data", "nlu.yml")
+_ANNOTATION_RE = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+
+
+def load_examples(path):
+    """(intent, text) pairs from an NLU training file, annotations removed"""
+    examples = []
+    intent = None
+    with open(path) as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("- intent:"):
+                intent = stripped.split(":", 1)[1].strip()
+            elif intent and line.startswith("    - "):
+                examples.append((intent, _ANNOTATION_RE.sub(r"\1", stripped[2:])))
+    return examples
+
+
+def synthetic(rng, n):
+    """Form answers as users type them: bare order IDs and emails"""
+    out = []
+    for i in range(n):
+        if i % 2:
+            out.append(("provide_order_id", str(rng.randint(10000, 999999))))
+        else:
+            out.append(("provide_email", f"user{rng.randint(1, 99999)}@example.com"))
+    return out
+
+
+def time_parse(url, texts, repeats):
+    import httpx
+
+    latencies = []
+    with httpx.Client(base_url=url, timeout=30.0) as client:
+        for _ in range(repeats):
+            for text in texts:
+                start = time.perf_counter()
+                client.post("/model/parse", json={"text": text}).raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--synthetic", type=int, default=200,
+                        help="extra bare order IDs / emails to include")
+    parser.add_argument("--iterations", type=int, default=200, help="passes over the corpus")
+    parser.add_argument("--rasa-url", help="also time /model/parse on a running Rasa server")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    matcher = StructuredMatcher()
+    training = load_examples(NLU_PATH)
+    corpus = training + synthetic(random.Random(args.seed), args.synthetic)
+
+    rules = Counter()
+    disagreements = []
+    bypassed, modelled = [], []
+    for intent, text in corpus:
+        match = matcher.match(text)
+        if match is None:
+            modelled.append(text)
+            continue
+        bypassed.append(text)
+        rules[match.rule] += 1
+        if match.intent != intent:
+            disagreements.append((text, intent, match.intent))
+
+    training_hits = sum(1 for _, text in training if matcher.match(text))
+    print(f"{len(training)} training examples: {training_hits} bypassed "
+          f"({training_hits / len(training):.1%})")
+    print(f"{len(corpus)} messages incl. synthetic: {len(bypassed)} bypassed "
+          f"({len(bypassed) / len(corpus):.1%}) {dict(rules)}")
+    print(f"intent disagreements with annotations: {len(disagreements)}")
+    for text, expected, got in disagreements:
+        print(f"    {text!r}: annotated {expected}, matched {got}")
+
+    texts = [text for _, text in corpus]
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for text in texts:
+            matcher.match(text)
+    per_message = (time.perf_counter() - start) / (args.iterations * len(texts)) * 1e6
+    print(f"matcher: {per_message:.2f} us/message")
+
+    if args.rasa_url:
+        fast = time_parse(args.rasa_url, bypassed[:100], 3)
+        slow = time_parse(args.rasa_url, modelled[:100], 3)
+        print(f"/model/parse p50: bypassed {fast:.2f} ms, model {slow:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
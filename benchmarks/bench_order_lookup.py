@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark for order tracking and complaint lookups on a large orders table
+Seeds a copy of the store database with synthetic users, orders and
+complaints, then times the old email-join order query against the cached
+user id + primary key path, and complaint lookups with and without the
+foreign-key indexes
+
+Usage (from the repo root):
+    python benchmarks/bench_order_lookup.py --orders 2000000 --lookups 20000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+from actions.cache import get_user_cache  # noqa: E402
+from actions.orders import fetch_order  # noqa: E402
+
+# The order query used before the narrowed projection and user id cache
+LEGACY_ORDER_STATUS = """
+    SELECT o.*, u.name, u.email
+    FROM orders o
+    JOIN users u ON o.user_id = u.id
+    WHERE o.id = ? AND u.email = ?
+"""
+
+COMPLAINTS_FOR_ORDER = "SELECT id, status, topic FROM complaints WHERE order_id = ?"
+
+FK_INDEXES = ("idx_complaints_order", "idx_complaints_user", "idx_orders_user",
+              "idx_order_items_order")
+
+STATUSES = ("processing", "shipped", "delivered", "cancelled")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=os.path.join(ROOT, "data", "earphones_store.db"),
+                        help="database to copy and seed")
+    parser.add_argument("--orders", type=int, default=2_000_000, help="orders to add")
+    parser.add_argument("--users", type=int, default=200_000, help="users to add")
+    parser.add_argument("--lookups", type=int, default=20_000, help="timed lookups per case")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def seed(conn, n_users, n_orders, rng):
+    """Bulk-insert synthetic rows; returns (order_id, email) pairs to look up"""
+    start = time.perf_counter()
+    first_user = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM users").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO users (id, name, email, address) VALUES (?, ?, ?, ?)",
+        ((first_user + i, f"User {i}", f"user{i}@bench.example", f"{i} Bench St")
+         for i in range(n_users)),
+    )
+    first_order = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM orders").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO orders (id, user_id, shipping_address, order_amount, status, created_time) "
+        "VALUES (?, ?, ?, ?, ?, '2024-06-01 12:00:00')",
+        ((first_order + i, first_user + i % n_users, f"{i % n_users} Bench St",
+          round(rng.uniform(20, 500), 2), STATUSES[i % len(STATUSES)])
+         for i in range(n_orders)),
+    )
+    conn.executemany(
+        "INSERT INTO complaints (order_id, user_id, topic, description) VALUES (?, ?, ?, ?)",
+        ((first_order + i, first_user + i % n_users, "Shipping", "Late delivery")
+         for i in range(0, n_orders, 10)),
+    )
+    conn.commit()
+    print(f"seeded {n_users} users / {n_orders} orders in {time.perf_counter() - start:.1f}s")
+
+    pairs = []
+    for _ in range(1000):
+        i = rng.randrange(n_orders)
+        pairs.append((first_order + i, f"user{i % n_users}@bench.example"))
+    return pairs
+
+
+def timed(label, lookups, func, pairs):
+    start = time.perf_counter()
+    for n in range(lookups):
+        func(*pairs[n % len(pairs)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / lookups * 1e6:8.2f} us/lookup")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-orders-")
+    path = os.path.join(tmpdir, "earphones_store.db")
+    shutil.copy(args.db, path)
+    try:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        pairs = seed(conn, args.users, args.orders, rng)
+
+        timed("order: email join (legacy)", args.lookups,
+              lambda o, e: conn.execute(LEGACY_ORDER_STATUS, (o, e)).fetchone(), pairs)
+        get_user_cache().invalidate()
+        timed("order: user id cache (cold)", len(pairs),
+              lambda o, e: fetch_order(conn, o, e), pairs)
+        timed("order: user id cache (warm)", args.lookups,
+              lambda o, e: fetch_order(conn, o, e), pairs)
+
+        def complaints(order_id, _email):
+            return conn.execute(COMPLAINTS_FOR_ORDER, (order_id,)).fetchall()
+
+        timed("complaints by order (indexed)", args.lookups, complaints, pairs)
+        for name in FK_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        timed("complaints by order (no index)", max(args.lookups // 100, 10), complaints, pairs)
+        conn.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the price range parser
+Compares the memoized parser, the same parser without memoization and the
+old split-on-"$"/"-" logic over a corpus of budget utterances
+
+Usage (from the repo root):
+    python benchmarks/bench_price_parser.py --rounds 2000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+from actions.pricing import parse_price_range  # noqa: E402
+
+# Budget answers as users type them into the recommendation form
+CORPUS = [
+    "under $100", "$200-$400", "under $50", "$50-$200", "over $400",
+    "budget", "premium", "cheap", "something affordable", "high-end",
+    "between 100 and 200", "under 150 dollars", "less than 80 bucks",
+    "from $50 to $150", "around $200", "about 300", "up to $250",
+    "no more than 120", "at least 250", "above 300", "$300", "150",
+    "my budget is under $100", "budget around $200-$400", "mid-range",
+    "any", "no preference", "doesn't matter", "1.5k", "$1,200 - $2,000",
+]
+
+
+def legacy_parse(price_range):
+    """The parsing DatabaseManager.search_products used to do inline"""
+    if "under" in price_range.lower():
+        return None, float(price_range.split("$")[1]) if "$" in price_range else 100
+    elif "-" in price_range:
+        price_parts = price_range.replace("$", "").split("-")
+        if len(price_parts) == 2:
+            return float(price_parts[0]), float(price_parts[1])
+    elif "over" in price_range.lower():
+        return float(price_range.split("$")[1]) if "$" in price_range else 400, None
+    return None, None
+
+
+def run_corpus(parse):
+    for text in CORPUS:
+        try:
+            parse(text)
+        except ValueError:
+            pass
+
+
+def coverage(parse):
+    """(utterances raising ValueError, utterances yielding no bounds)"""
+    errors = unbounded = 0
+    for text in CORPUS:
+        try:
+            low, high = parse(text)
+        except ValueError:
+            errors += 1
+            continue
+        if low is None and high is None:
+            unbounded += 1
+    return errors, unbounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=2000, help="passes over the corpus")
+    args = parser.parse_args()
+
+    uncached = parse_price_range.__wrapped__
+    candidates = (
+        ("legacy split", legacy_parse),
+        ("parser (no memo)", uncached),
+        ("parser (memoized)", parse_price_range),
+    )
+
+    calls = args.rounds * len(CORPUS)
+    print(f"{len(CORPUS)} utterances x {args.rounds} rounds")
+    for label, parse in candidates:
+        errors, unbounded = coverage(parse)
+        seconds = timeit.timeit(lambda: run_corpus(parse), number=args.rounds)
+        print(f"{label:<18} {seconds / calls * 1e6:7.2f} us/call  "
+              f"errors={errors:<3} no-bounds={unbounded}")
+
+
+if __name__ == "__main__":
+    main()
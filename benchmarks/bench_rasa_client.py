@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the frontend's Rasa HTTP client
+Runs many concurrent chat sessions against a stub streaming REST webhook
+(or a real Rasa server with --rasa-url) and compares a new AsyncClient per
+message, as send_to_rasa used to do, with the shared pooled client
+
+Usage (from the repo root):
+    python benchmarks/bench_rasa_client.py --sessions 300 --turns 10
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_client_module():
+    # Load rasa_client.py on its own; importing the frontend package needs reflex
+    path = os.path.join(ROOT, "frontend", "frontend", "rasa_client.py")
+    spec = importlib.util.spec_from_file_location("rasa_client", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve_stub(port):
+    """Stub REST webhook streaming two bot messages per request, like Rasa's"""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+
+    async def webhook(request):
+        await request.body()
+
+        async def lines():
+            yield b'{"recipient_id": "user", "text": "first"}\n'
+            await asyncio.sleep(0.002)
+            yield b'{"recipient_id": "user", "text": "second"}\n'
+
+        return StreamingResponse(lines(), media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/webhooks/rest/webhook", webhook, methods=["POST"])])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error", backlog=4096, ws="none")
+
+
+def start_stub_server():
+    """Run the stub in its own process so it doesn't share the GIL with the clients"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)])
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError("stub server failed to start")
+        try:
+            httpx.get(url)
+            return url, process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("stub server did not come up")
+
+
+async def per_message_client(url, sender, message):
+    async with httpx.AsyncClient() as client:
+        async with client.stream("POST", f"{url}/webhooks/rest/webhook?stream=true",
+                                 json={"sender": sender, "message": message},
+                                 timeout=30.0) as response:
+            async for _ in response.aiter_lines():
+                pass
+
+
+async def shared_client(rasa_client, sender, message):
+    async for _ in rasa_client.stream_messages(sender, message):
+        pass
+
+
+async def run(send, sessions, turns):
+    latencies = []
+
+    async def session(n):
+        for turn in range(turns):
+            start = time.perf_counter()
+            await send(f"bench-{n}", f"message {turn}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(n) for n in range(sessions)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=300, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=10, help="messages per session")
+    parser.add_argument("--rasa-url", help="benchmark a running Rasa server instead of the stub")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve_stub(args.serve)
+        return
+
+    server = None
+    url = args.rasa_url
+    if url is None:
+        url, server = start_stub_server()
+    os.environ["RASA_URL"] = url
+    rasa_client = load_client_module()
+
+    candidates = (
+        ("client per message", lambda s, m: per_message_client(url, s, m)),
+        ("shared pooled client", lambda s, m: shared_client(rasa_client, s, m)),
+    )
+    total = args.sessions * args.turns
+    print(f"{args.sessions} sessions x {args.turns} messages against {url}")
+    try:
+        for label, send in candidates:
+            async def measure():
+                await run(send, min(args.sessions, 10), 1)  # warm up
+                result = await run(send, args.sessions, args.turns)
+                await rasa_client.close_client()
+                return result
+
+            elapsed, latencies = asyncio.run(measure())
+            ms = sorted(l * 1000 for l in latencies)
+            cuts = statistics.quantiles(ms, n=100, method="inclusive")
+            print(f"{label:<22} {total / elapsed:8.0f} msg/s  p50 {cuts[49]:7.2f} ms  "
+                  f"p95 {cuts[94]:7.2f} ms")
+        print(rasa_client.call_stats.stats())
+    finally:
+        if server is not None:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
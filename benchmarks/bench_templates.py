@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for action message rendering
+Times the old `message +=` string building against the compiled templates
+and cached product snippets for search results, recommendations and order
+status messages at growing result list sizes (and checks both produce the
+same text)
+
+Usage (from the repo root):
+    python benchmarks/bench_templates.py --sizes 5 50 500 --turns 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+from actions import templates  # noqa: E402
+
+BRANDS = ("Sony", "Apple", "Bose", "Sennheiser", "JBL", "Audio-Technica", "Beats")
+TAGS = ("wireless", "noise-cancelling", "over-ear", "in-ear", "premium", "budget", "sport")
+STATUSES = ("processing", "shipped", "delivered", "cancelled", "returned")
+
+
+# The message building the actions used before templates.py ----------------
+
+def legacy_search(results):
+    message = "I found these products:\n"
+    for product in results:
+        message += (
+            f"\n- {product[1]} by {product[2]} "
+            f"(Price: ${product[3]:.2f}, Stock: {product[4]}, "
+            f"Rating: {product[5]}/5)"
+        )
+    return message
+
+
+def legacy_recommendations(products):
+    message = "Based on your preferences, here are my top recommendations:\n\n"
+    for i, product in enumerate(products, 1):
+        message += f"{i}. **{product[1]}** by {product[2]}\n"
+        message += f"   💰 ${product[3]:.2f} | ⭐ {product[5]}/5 stars\n"
+        message += f"   🔖 {product[6]}\n\n"
+    message += "These products match your criteria perfectly! Would you like more details about any of them?"
+    return message
+
+
+def legacy_order_status(order_id, order):
+    status = order[4]
+    status_emoji = {
+        "processing": "⏳",
+        "shipped": "🚚",
+        "delivered": "✅",
+        "cancelled": "❌"
+    }.get(status.lower(), "📦")
+    message = "📋 **Order Status Update**\n\n"
+    message += f"🆔 Order ID: {order_id}\n"
+    message += f"{status_emoji} Status: **{status.upper()}**\n"
+    message += f"💰 Amount: ${order[3]:.2f}\n"
+    message += f"📅 Order Date: {order[5]}\n"
+    message += f"🏠 Shipping Address: {order[2]}\n\n"
+    if status.lower() == "processing":
+        message += "Your order is being prepared and will ship soon!"
+    elif status.lower() == "shipped":
+        message += "Your order is on its way! You should receive it in 2-3 business days."
+    elif status.lower() == "delivered":
+        message += "Your order has been delivered! We hope you enjoy your new earphones!"
+    elif status.lower() == "cancelled":
+        message += "Your order has been cancelled. If you have questions, please contact our support team."
+    return message
+
+
+def make_products(n, rng):
+    return [
+        (i, f"{rng.choice(BRANDS)} Model {i}", rng.choice(BRANDS),
+         round(rng.uniform(20, 500), 2), rng.randint(0, 200), round(rng.uniform(3, 5), 1),
+         ",".join(rng.sample(TAGS, 3)))
+        for i in range(1, n + 1)
+    ]
+
+
+def make_orders(n, rng):
+    return [
+        (100000 + i, i, f"{i} Bench St", round(rng.uniform(20, 500), 2),
+         rng.choice(STATUSES), "2024-06-01 12:00:00")
+        for i in range(n)
+    ]
+
+
+def timed(func, inputs, turns):
+    start = time.perf_counter()
+    for n in range(turns):
+        func(inputs[n % len(inputs)])
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500],
+                        help="products per rendered message")
+    parser.add_argument("--turns", type=int, default=2000, help="messages rendered per case")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # Turns draw their result lists from a fixed catalog, as real searches do
+    catalog = make_products(2000, rng)
+    cache = templates.get_snippet_cache()
+    cache.table = None
+
+    print(f"{'case':<28} {'legacy us':>10} {'template us':>12} {'speedup':>8}")
+    for size in args.sizes:
+        lists = [rng.sample(catalog, min(size, len(catalog))) for _ in range(50)]
+        for label, legacy, render in (
+            ("search", legacy_search, templates.render_search_results),
+            ("recommendations", legacy_recommendations, templates.render_recommendations),
+        ):
+            assert all(legacy(rows) == render(rows) for rows in lists), label
+            cache.clear()
+            render(lists[0])  # first turn renders, later turns hit the cache
+            old = timed(legacy, lists, args.turns)
+            new = timed(render, lists, args.turns)
+            print(f"{label + f' x{size}':<28} {old:10.2f} {new:12.2f} {old / new:7.1f}x")
+
+    orders = make_orders(1000, rng)
+    assert all(legacy_order_status(o[0], o) == templates.render_order_status(o[0], o)
+               for o in orders)
+    old = timed(lambda o: legacy_order_status(o[0], o), orders, args.turns)
+    new = timed(lambda o: templates.render_order_status(o[0], o), orders, args.turns)
+    print(f"{'order status':<28} {old:10.2f} {new:12.2f} {old / new:7.1f}x")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the persistent conversation store behind the Rasa tracker store
+Fills a fresh database with synthetic conversations (Rasa-shaped event
+dicts), then times loads of hot (cached) and cold conversations and saves
+of a conversation after a new turn. Rasa's own tracker replay on top of a
+load is not included.
+
+Usage (from the repo root):
+    python benchmarks/bench_tracker_store.py --conversations 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+from components.conversations import (  # noqa: E402
+    UPSERT_CONVERSATION, ConversationStore, encode_events,
+)
+
+INTENTS = ("greet", "search_products", "track_order", "provide_email", "provide_order_id",
+           "inform_preferences", "file_complaint", "goodbye")
+
+
+def turn(rng, ts):
+    """Events of one user turn: user message, bot action, reply, listen"""
+    intent = rng.choice(INTENTS)
+    return [
+        {"event": "user", "timestamp": ts, "text": f"message about {intent} {rng.randint(1, 999)}",
+         "parse_data": {"intent": {"name": intent, "confidence": round(rng.random(), 4)},
+                        "entities": [], "text": intent},
+         "input_channel": "rest", "message_id": f"{rng.getrandbits(64):016x}", "metadata": {}},
+        {"event": "action", "timestamp": ts + 0.01, "name": f"action_{intent}",
+         "policy": "TEDPolicy", "confidence": 0.97},
+        {"event": "bot", "timestamp": ts + 0.02, "text": f"Here is what I found for {intent}",
+         "data": {}, "metadata": {"utter_action": f"utter_{intent}"}},
+        {"event": "action", "timestamp": ts + 0.03, "name": "action_listen",
+         "policy": "TEDPolicy", "confidence": 0.99},
+    ]
+
+
+def conversation(rng, turns):
+    ts = time.time() - 3600
+    events = [{"event": "action", "timestamp": ts, "name": "action_session_start"},
+              {"event": "session_started", "timestamp": ts},
+              {"event": "action", "timestamp": ts, "name": "action_listen"}]
+    for _ in range(turns):
+        ts += rng.uniform(5, 60)
+        events.extend(turn(rng, ts))
+    return events
+
+
+def timed(func, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append((time.perf_counter() - start) * 1000)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return f"p50 {cuts[49]:.3f} ms  p95 {cuts[94]:.3f} ms  p99 {cuts[98]:.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conversations", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=10, help="user turns per conversation")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "conversations.db")
+        store = ConversationStore(path, cache_size=args.cache_size)
+        ids = [f"user-{n}" for n in range(args.conversations)]
+        start = time.perf_counter()
+        with store._pool.connection() as conn:
+            # One transaction for the fill; per-save commits are timed below
+            with conn:
+                for sender_id in ids:
+                    events = conversation(rng, rng.randint(1, 2 * args.turns))
+                    conn.execute(UPSERT_CONVERSATION,
+                                 (sender_id, time.time(), len(events), encode_events(events))
+                                 ).fetchall()
+        size = os.path.getsize(path) + os.path.getsize(path + "-wal")
+        print(f"stored {args.conversations} conversations in {time.perf_counter() - start:.1f}s "
+              f"({size / args.conversations:.0f} bytes each on disk)")
+
+        hot = ids[:args.cache_size]
+        for sender_id in hot:
+            store.load(sender_id)
+        print(f"load, cached:   {timed(store.load, rng.choices(hot, k=args.samples))}")
+        cold = rng.sample(ids[args.cache_size:], args.samples)
+        print(f"load, uncached: {timed(store.load, cold)}")
+
+        sessions = {sender_id: store.load(sender_id) for sender_id in hot}
+        picks = rng.choices(hot, k=args.samples)
+
+        def save(sender_id):
+            sessions[sender_id] = store.save(
+                sender_id, sessions[sender_id] + turn(rng, time.time()))
+
+        print(f"save (+1 turn): {timed(save, picks)}")
+        print(store.stats())
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency benchmark for the action server, backend API and chat
+Drives the DB-backed Rasa actions with real Tracker/CollectingDispatcher
+objects, the FastAPI routes through an in-process TestClient and,
+optionally, a running Rasa server's REST channel. Reports p50/p95/p99
+latency and throughput per scenario for each database, writes the results
+as JSON and compares them against a stored baseline
+
+Usage (from the repo root):
+    python benchmarks/e2e.py --iterations 500 --scale 0.2 --output bench.json
+    python benchmarks/e2e.py --baseline benchmarks/baseline.json
+    python benchmarks/e2e.py --db large=data/earphones_large.db --rasa-url http://localhost:5005
+
+Each database is copied to a temporary directory (complaint scenarios
+write to it) and benchmarked in its own subprocess, so connection pools
+and caches never carry over between databases.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(ROOT, "data", "earphones_store.db")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+SEARCH_TERMS = ["sony", "wireless", "noise cancelling", "airpods", "bose headphones",
+                "audio-technica", "budget earbuds", "studio monitor", "jbl", "sennheiser hd"]
+RECOMMENDATION_SLOTS = [
+    {"preferred_brand": "any", "price_range": "under $300",
+     "product_type": "over-ear", "features": "noise-cancelling"},
+    {"preferred_brand": "Sony", "price_range": "any", "product_type": "any", "features": "any"},
+    {"preferred_brand": "no preference", "price_range": "$50-$200",
+     "product_type": "in-ear", "features": "wireless"},
+    {"preferred_brand": "Bose", "price_range": "premium", "product_type": "any", "features": "any"},
+    {"preferred_brand": "any", "price_range": "budget", "product_type": "any",
+     "features": "wireless, portable"},
+]
+CHAT_MESSAGES = ["hi", "show me sony headphones", "I want wireless earbuds under $200",
+                 "where is my order", "thanks"]
+
+
+# Statistics ---------------------------------------------------------------
+
+def summarize(latencies, wall_seconds):
+    """Latency percentiles (ms) and throughput for one scenario"""
+    ms = sorted(l * 1000 for l in latencies)
+    cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "calls": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "p50_ms": round(cuts[49], 4),
+        "p95_ms": round(cuts[94], 4),
+        "p99_ms": round(cuts[98], 4),
+        "max_ms": round(ms[-1], 4),
+        "throughput_per_s": round(len(ms) / wall_seconds, 1),
+    }
+
+
+def measure(func, iterations, warmup):
+    for i in range(warmup):
+        func(i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+# Worker: runs every scenario against one database -------------------------
+
+def sample_orders(db_path, count, seed):
+    """(order_id, email) pairs spread over the whole orders table"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    try:
+        low, high = conn.execute("SELECT min(id), max(id) FROM orders").fetchone()
+        pairs = []
+        for _ in range(count):
+            row = conn.execute("""
+                SELECT o.id, u.email FROM orders o JOIN users u ON u.id = o.user_id
+                WHERE o.id >= ? ORDER BY o.id LIMIT 1
+            """, (rng.randint(low, high),)).fetchone()
+            pairs.append(row)
+        return pairs
+    finally:
+        conn.close()
+
+
+def table_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {t: conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0]
+                for t in ("products", "users", "orders", "order_items", "complaints")}
+    finally:
+        conn.close()
+
+
+def make_tracker(slots, entities=()):
+    from rasa_sdk import Tracker
+
+    return Tracker(
+        sender_id="e2e-bench",
+        slots=slots,
+        latest_message={"entities": list(entities), "intent": {}, "text": ""},
+        events=[],
+        paused=False,
+        followup_action=None,
+        active_loop={},
+        latest_action_name=None,
+    )
+
+
+def action_scenarios(orders):
+    from rasa_sdk.executor import CollectingDispatcher
+    from actions.actions import (
+        ActionGetRecommendations, ActionLodgeComplaint, ActionSearchProducts, ActionTrackOrder,
+    )
+
+    loop = asyncio.new_event_loop()
+
+    def runner(action, trackers):
+        return lambda i: loop.run_until_complete(
+            action.run(CollectingDispatcher(), trackers[i % len(trackers)], {}))
+
+    search = [make_tracker({}, [{"entity": "search_term", "value": t}]) for t in SEARCH_TERMS]
+    recommend = [make_tracker(slots) for slots in RECOMMENDATION_SLOTS]
+    track = [make_tracker({"order_id": str(o), "user_email": e}) for o, e in orders]
+    complain = [make_tracker({"order_id": str(o), "user_email": e,
+                              "complaint_topic": "Shipping Delay",
+                              "complaint_description": "Benchmark complaint"})
+                for o, e in orders]
+    return loop, {
+        "action.search_products": runner(ActionSearchProducts(), search),
+        "action.get_recommendations": runner(ActionGetRecommendations(), recommend),
+        "action.track_order": runner(ActionTrackOrder(), track),
+        "action.lodge_complaint": runner(ActionLodgeComplaint(), complain),
+    }
+
+
+def api_scenarios(orders):
+    sys.path.insert(0, os.path.join(ROOT, "backend"))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        from fastapi.testclient import TestClient
+        from backend import app
+
+    client = TestClient(app)
+    searches = [{"query": t} for t in SEARCH_TERMS] + [
+        {"brand": s["preferred_brand"], "price_range": s["price_range"],
+         "product_type": s["product_type"], "features": s["features"]}
+        for s in RECOMMENDATION_SLOTS
+    ]
+
+    def search(i):
+        client.post("/search_products", json=searches[i % len(searches)]).raise_for_status()
+
+    def order_status(i):
+        order_id, email = orders[i % len(orders)]
+        client.get("/order_status", params={
+            "order_id": order_id, "email": email.replace("@", "ATSYMB"),
+        }).raise_for_status()
+
+    def create_complaint(i):
+        order_id, email = orders[i % len(orders)]
+        client.post("/create_complaint", json={
+            "order_id": order_id, "user_email": email,
+            "topic": "Shipping Delay", "description": "Benchmark complaint",
+        }).raise_for_status()
+
+    return client, {
+        "api.search_products": search,
+        "api.order_status": order_status,
+        "api.create_complaint": create_complaint,
+    }
+
+
+def chat_scenarios(rasa_url):
+    import httpx
+
+    client = httpx.Client(base_url=rasa_url, timeout=30)
+
+    def payload(i):
+        return {"sender": f"e2e-bench-{i % 20}", "message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]}
+
+    def chat(i):
+        client.post("/webhooks/rest/webhook", json=payload(i)).raise_for_status()
+
+    def first_message(i):
+        # Time until the first streamed bot message, as the frontend sees it
+        with client.stream("POST", "/webhooks/rest/webhook?stream=true", json=payload(i)) as r:
+            r.raise_for_status()
+            next(r.iter_lines(), None)
+
+    return client, {"chat.round_trip": chat, "chat.first_message": first_message}
+
+
+def run_worker(args):
+    """Benchmark one database copy and write the results as JSON"""
+    os.environ["EARPHONES_DB_PATH"] = args.worker
+    if args.no_cache:
+        os.environ["EARPHONES_CACHE_SIZE"] = "0"
+    sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+    orders = sample_orders(args.worker, 200, args.seed)
+    results = {"tables": table_counts(args.worker), "scenarios": {}}
+
+    loop, actions = action_scenarios(orders)
+    client, api = api_scenarios(orders)
+    scenarios = {**actions, **api}
+    chat_client = None
+    if args.rasa_url:
+        chat_client, chat = chat_scenarios(args.rasa_url)
+        scenarios.update(chat)
+
+    try:
+        for name, func in scenarios.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            results["scenarios"][name] = measure(func, args.iterations, args.warmup)
+    finally:
+        loop.close()
+        client.close()
+        if chat_client is not None:
+            chat_client.close()
+        from actions.db import close_pool
+        close_pool()
+
+    with open(args.worker_output, "w") as f:
+        json.dump(results, f)
+
+
+# Orchestration ------------------------------------------------------------
+
+def generate_database(directory, scale, seed):
+    sys.path.insert(0, ROOT)
+    import setup_database
+
+    path = os.path.join(directory, f"generated-{scale:g}.db")
+    print(f"generating scale {scale} database...", flush=True)
+    setup_database.setup_database(path)
+    setup_database.create_database(path)
+    setup_database.generate_scale_data(path, scale, seed)
+    setup_database.migrate_database(path)
+    setup_database.analyze_database(path)
+    return path
+
+
+def benchmark_database(label, path, args, tmp_dir):
+    copy = os.path.join(tmp_dir, f"{label}.db")
+    shutil.copy(path, copy)
+    out = os.path.join(tmp_dir, f"{label}.json")
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", copy, "--worker-output", out,
+           "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+           "--seed", str(args.seed)]
+    if args.no_cache:
+        cmd.append("--no-cache")
+    if args.rasa_url:
+        cmd += ["--rasa-url", args.rasa_url]
+    for part in args.only or ():
+        cmd += ["--only", part]
+    # The actions print debug output; keep it out of the report
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    with open(out) as f:
+        return json.load(f)
+
+
+def print_report(report):
+    header = f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}"
+    for label, result in report["databases"].items():
+        tables = ", ".join(f"{n} {t}" for t, n in result["tables"].items())
+        print(f"\n[{label}] {tables}")
+        print(header)
+        for name, s in result["scenarios"].items():
+            print(f"{name:<28}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}"
+                  f"{s['throughput_per_s']:>10.0f}")
+
+
+def compare(report, baseline, metric, tolerance, min_delta_ms):
+    """Scenarios whose metric got worse than the baseline by more than tolerance"""
+    regressions = []
+    print(f"\nComparison with baseline ({metric}, tolerance {tolerance:.0%}):")
+    for label, result in report["databases"].items():
+        base = baseline.get("databases", {}).get(label)
+        if base is None:
+            print(f"  [{label}] not in baseline")
+            continue
+        for name, stats in result["scenarios"].items():
+            if name not in base["scenarios"]:
+                continue
+            old, new = base["scenarios"][name][metric], stats[metric]
+            change = (new - old) / old if old else 0.0
+            regressed = change > tolerance and new - old > min_delta_ms
+            flag = "REGRESSION" if regressed else "ok"
+            print(f"  [{label}] {name:<28} {old:9.3f} -> {new:9.3f} ms ({change:+.0%}) {flag}")
+            if regressed:
+                regressions.append(f"{label}/{name}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", action="append", metavar="LABEL=PATH",
+                        help=f"database to benchmark (repeatable, default small={DEFAULT_DB})")
+    parser.add_argument("--scale", type=float, action="append", default=[],
+                        help="also benchmark a generated database of this scale (repeatable)")
+    parser.add_argument("--iterations", type=int, default=500, help="timed calls per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed calls per scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", action="append", help="run scenarios whose name contains this")
+    parser.add_argument("--no-cache", action="store_true", help="disable the product result cache")
+    parser.add_argument("--rasa-url", help="running Rasa server for the chat round trip scenario")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help=f"compare against this report (e.g. {DEFAULT_BASELINE})")
+    parser.add_argument("--metric", default="p95_ms", choices=("p50_ms", "p95_ms", "p99_ms"))
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before flagging a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this (timer noise)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    databases = dict(entry.split("=", 1) for entry in args.db or [f"small={DEFAULT_DB}"])
+    tmp_dir = tempfile.mkdtemp(prefix="earphones-e2e-")
+    try:
+        for scale in args.scale:
+            databases[f"scale-{scale:g}"] = generate_database(tmp_dir, scale, args.seed)
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "iterations": args.iterations,
+                "cache": not args.no_cache,
+            },
+            "databases": {},
+        }
+        for label, path in databases.items():
+            print(f"benchmarking {label}...", flush=True)
+            report["databases"][label] = benchmark_database(label, path, args, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.metric, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Load test for the action server's database path
+Runs many concurrent conversations through the DB-backed actions, once with
+DB calls executed inline on the event loop (the old synchronous behaviour)
+and once through the bounded DB thread pool, and compares throughput
+
+Usage (from the repo root):
+    python benchmarks/load_actions.py --sessions 200 --turns 20
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=os.path.join(ROOT, "data", "earphones_store.db"),
+                        help="database to copy and run against")
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=20, help="actions per conversation")
+    parser.add_argument("--workers", type=int, default=8, help="DB thread pool size")
+    return parser.parse_args()
+
+
+def make_tracker(slots, entities=()):
+    from rasa_sdk import Tracker
+
+    return Tracker(
+        sender_id="load-test",
+        slots=slots,
+        latest_message={"entities": list(entities), "intent": {}, "text": ""},
+        events=[],
+        paused=False,
+        followup_action=None,
+        active_loop={},
+        latest_action_name=None,
+    )
+
+
+def build_turns():
+    """(action, tracker) pairs cycled through by every session"""
+    from actions.actions import (
+        ActionGetRecommendations, ActionSearchProducts, ActionTrackOrder,
+    )
+
+    return [
+        (ActionSearchProducts(), make_tracker(
+            {}, [{"entity": "search_term", "value": "sony wireless"}])),
+        (ActionGetRecommendations(), make_tracker({
+            "preferred_brand": "any", "price_range": "under $300",
+            "product_type": "over-ear", "features": "noise-cancelling",
+        })),
+        (ActionTrackOrder(), make_tracker({
+            "order_id": "111111", "user_email": "john.doe@email.com",
+        })),
+    ]
+
+
+async def run_session(turns, n_turns):
+    from rasa_sdk.executor import CollectingDispatcher
+
+    for i in range(n_turns):
+        action, tracker = turns[i % len(turns)]
+        await action.run(CollectingDispatcher(), tracker, {})
+
+
+async def run_load(sessions, n_turns):
+    turns = build_turns()
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(turns, n_turns) for _ in range(sessions)))
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="earphones-load-")
+    db_copy = os.path.join(tmp_dir, "earphones_store.db")
+    shutil.copy(args.db, db_copy)
+    os.environ["EARPHONES_DB_PATH"] = db_copy
+    os.environ["EARPHONES_DB_POOL_SIZE"] = str(args.workers)
+    sys.path.insert(0, os.path.join(ROOT, "earphones_chatbot"))
+
+    from actions import db
+
+    total = args.sessions * args.turns
+    try:
+        results = {}
+        for label, workers in (("sync (inline)", 0), ("async (executor)", args.workers)):
+            db.EXECUTOR_WORKERS = workers
+            db.close_pool()
+            asyncio.run(run_load(min(args.sessions, 8), 2))  # warm up
+            elapsed = asyncio.run(run_load(args.sessions, args.turns))
+            results[label] = total / elapsed
+            print(f"{label:<18} {total} actions in {elapsed:.2f}s "
+                  f"-> {results[label]:.0f} actions/s")
+
+        sync_rate, async_rate = results.values()
+        print(f"speedup: {async_rate / sync_rate:.2f}x")
+    finally:
+        db.close_pool()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
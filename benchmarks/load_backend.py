@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Load test for the FastAPI backend
+Starts the backend under uvicorn (one or more workers) on a copy of a store
+database, then drives /search_products and /order_status with many
+concurrent keep-alive clients and reports throughput and latency percentiles
+
+Usage (from the repo root):
+    python benchmarks/load_backend.py --workers 4 --concurrency 200 --requests 20000
+    python benchmarks/load_backend.py --db data/earphones_large.db --module my_backend_copy
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Search criteria in the shape the chatbot sends; repeats exercise the cache
+SEARCHES = (
+    {"query": "sony"},
+    {"brand": "Apple"},
+    {"price_range": "under 100"},
+    {"product_type": "wireless", "features": "noise-cancelling"},
+    {"query": "earbuds", "price_range": "50-200"},
+    {"brand": "Bose", "features": "premium"},
+    {"query": "gaming headset"},
+    {"product_type": "over-ear", "price_range": "over 200"},
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=os.path.join(ROOT, "data", "earphones_store.db"),
+                        help="database to copy and serve")
+    parser.add_argument("--module", default="backend",
+                        help="module in backend/ holding the app (to compare versions)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=100, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=10_000, help="requests per endpoint")
+    parser.add_argument("--only", choices=("search", "order"), help="load one endpoint only")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_server(module, db_path, workers):
+    port = free_port()
+    env = dict(os.environ, EARPHONES_DB_PATH=db_path)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app",
+         "--app-dir", os.path.join(ROOT, "backend"),
+         "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning",
+         "--backlog", "4096", "--ws", "none"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        if process.poll() is not None:
+            raise RuntimeError("backend failed to start")
+        try:
+            httpx.get(f"{url}/db_stats")
+            return url, process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("backend did not come up")
+
+
+def order_pairs(db_path, rng, n=1000):
+    conn = sqlite3.connect(db_path)
+    max_id = conn.execute("SELECT max(id) FROM orders").fetchone()[0]
+    pairs = []
+    while len(pairs) < n:
+        row = conn.execute(
+            "SELECT o.id, u.email FROM orders o JOIN users u ON u.id = o.user_id "
+            "WHERE o.id >= ? LIMIT 1", (rng.randint(1, max_id),)).fetchone()
+        if row:
+            pairs.append(row)
+    conn.close()
+    return pairs
+
+
+async def load(url, concurrency, total, make_request):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            nonlocal errors
+            for n in counter:
+                start = time.perf_counter()
+                try:
+                    response = await make_request(client, n)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+
+def report(label, total, elapsed, latencies, errors):
+    ms = sorted(l * 1000 for l in latencies)
+    cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    print(f"{label:<16} {total / elapsed:8.0f} req/s  p50 {cuts[49]:7.2f} ms  "
+          f"p95 {cuts[94]:7.2f} ms  p99 {cuts[98]:7.2f} ms  errors {errors}")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    tmpdir = tempfile.mkdtemp(prefix="load-backend-")
+    path = os.path.join(tmpdir, "earphones_store.db")
+    shutil.copy(args.db, path)
+    pairs = order_pairs(path, rng)
+
+    def search(client, n):
+        return client.post("/search_products", json=SEARCHES[n % len(SEARCHES)])
+
+    def order(client, n):
+        order_id, email = pairs[n % len(pairs)]
+        return client.get("/order_status", params={"order_id": order_id, "email": email})
+
+    scenarios = [("search_products", search), ("order_status", order)]
+    if args.only:
+        scenarios = [s for s in scenarios if s[0].startswith(args.only)]
+
+    url, server = start_server(args.module, path, args.workers)
+    print(f"{args.module} x{args.workers} workers, {args.concurrency} clients, "
+          f"{args.requests} requests per endpoint")
+    try:
+        for label, make_request in scenarios:
+            asyncio.run(load(url, min(args.concurrency, 20), 500, make_request))  # warm up
+            elapsed, latencies, errors = asyncio.run(
+                load(url, args.concurrency, args.requests, make_request))
+            report(label, args.requests, elapsed, latencies, errors)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,5 @@
 # Actions package for Earphones Store Chatbot
+import time
+
+# When the package started importing (the startup report's "imports" phase)
+IMPORT_STARTED = time.perf_counter()
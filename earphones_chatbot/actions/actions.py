@@ -7,140 +7,141 @@ Handles database interactions and business logic
 import sqlite3
 import logging
 from typing import Any, Text, Dict, List
-from datetime import datetime
 
 from rasa_sdk import Action, Tracker, FormValidationAction
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.types import DomainDict
 from rasa_sdk.events import SlotSet, ActiveLoop, ActionExecuted
 
+from . import metrics, templates
+from .cache import get_product_cache, recommendation_key, search_key
+from .catalog import get_catalog
+from .db import fetch_all, get_pool, run_db
+from .fuzzy import get_fuzzy_index, warm_up
+from .pricing import parse_price_range
+from .orders import fetch_order, resolve_user_id
+from .queries import product_filter
+from .search import build_match_query, normalize_brand, parse_tag_terms, search_products_fulltext
+from .snapshot import get_read_pool
+from .startup import WARM_START, mark_ready, warm_start
+from .writes import get_complaint_writer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database path
-DB_PATH = "../data/earphones_store.db"
+# The action server has no hook for extra routes, so metrics (and /ready) get their own port
+metrics.start_http_server()
+
+# rasa_sdk imports this module before it starts listening, so warming up
+# here keeps the first conversations off a cold pool and page cache
+if WARM_START:
+    warm_start()
+else:
+    # Build the typo-tolerant product index before the first search needs it
+    warm_up()
+    mark_ready()
 
 class DatabaseManager:
     """Helper class for database operations"""
     
     @staticmethod
     def get_connection():
-        """Get database connection"""
-        return sqlite3.connect(DB_PATH)
+        """Borrow a pooled database connection (use as a context manager)"""
+        return get_pool().connection()
+    
+    @staticmethod
+    def get_catalog_connection():
+        """Borrow a connection for product reads (the read snapshot when enabled)"""
+        return get_read_pool().connection()
     
     @staticmethod
     def search_products(query=None, brand=None, price_range=None, product_type=None, features=None):
         """Search products based on criteria"""
-        conn = DatabaseManager.get_connection()
-        cursor = conn.cursor()
-        
-        base_query = "SELECT * FROM products WHERE 1=1"
-        params = []
-        
-        if query:
-            base_query += " AND (name LIKE ? OR brand LIKE ? OR tags LIKE ?)"
-            params.extend([f"%{query}%", f"%{query}%", f"%{query}%"])
-        
-        if brand and brand.lower() != "any":
-            base_query += " AND LOWER(brand) LIKE ?"
-            params.append(f"%{brand.lower()}%")
-        
-        if price_range:
-            if "under" in price_range.lower():
-                price_limit = float(price_range.split("$")[1]) if "$" in price_range else 100
-                base_query += " AND price < ?"
-                params.append(price_limit)
-            elif "-" in price_range:
-                price_parts = price_range.replace("$", "").split("-")
-                if len(price_parts) == 2:
-                    min_price = float(price_parts[0])
-                    max_price = float(price_parts[1])
-                    base_query += " AND price BETWEEN ? AND ?"
-                    params.extend([min_price, max_price])
-            elif "over" in price_range.lower():
-                price_limit = float(price_range.split("$")[1]) if "$" in price_range else 400
-                base_query += " AND price > ?"
-                params.append(price_limit)
-        
-        if product_type and product_type.lower() != "any":
-            base_query += " AND tags LIKE ?"
-            params.append(f"%{product_type.lower()}%")
-        
-        if features and features.lower() != "any":
-            feature_list = features.split(",") if "," in features else [features]
-            for feature in feature_list:
-                feature = feature.strip().lower()
-                base_query += " AND tags LIKE ?"
-                params.append(f"%{feature}%")
-        
-        base_query += " ORDER BY rating DESC LIMIT 5"
-        
-        cursor.execute(base_query, params)
-        results = cursor.fetchall()
-        conn.close()
+        
+        query = query.strip() if query else None
+        brand = normalize_brand(brand)
+        price = parse_price_range(price_range)
+        tag_terms = parse_tag_terms(product_type, features)
+        
+        key = recommendation_key(query, brand, price.min_price, price.max_price, tag_terms, 5)
+        return get_product_cache().get_or_compute(
+            key,
+            lambda: tuple(DatabaseManager._filter_products(query, brand, price, tag_terms)),
+        )
+    
+    @staticmethod
+    def _filter_products(query, brand, price, tag_terms):
+        """Uncached structured product filter"""
+        
+        # Structured filters are answered from the in-memory catalog when enabled
+        catalog = get_catalog()
+        if catalog is not None and not query:
+            return catalog.search(brand, price.min_price, price.max_price, tag_terms, limit=5)
+        
+        match = build_match_query(query) if query else None
+        if query and match is None:
+            # A query with no searchable words matches nothing, not everything
+            return []
+        price_bounds = None if price.is_open else price.sql_bounds()
+        sql, params = product_filter(match, brand, price_bounds, tag_terms, limit=5)
+        
+        with DatabaseManager.get_catalog_connection() as conn:
+            results = fetch_all(conn, sql, params)
         
         return results
     
+    @staticmethod
+    def search_products_fulltext(search_term, limit=5):
+        """Ranked full-text search over product name, brand and tags (typo-tolerant fallback)"""
+        def compute():
+            with DatabaseManager.get_catalog_connection() as conn:
+                results = search_products_fulltext(conn, search_term, limit)
+            
+            # Nothing matched literally - try typo-tolerant matching
+            index = get_fuzzy_index()
+            if not results and index is not None:
+                results = index.search(search_term, limit)
+            return tuple(results)
+        
+        return get_product_cache().get_or_compute(search_key(search_term, limit), compute)
+    
     @staticmethod
     def get_order_status(order_id, email):
         """Get order status for given order ID and email"""
-        conn = DatabaseManager.get_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT o.*, u.name, u.email 
-        FROM orders o 
-        JOIN users u ON o.user_id = u.id 
-        WHERE o.id = ? AND u.email = ?
-        """
-        
-        cursor.execute(query, (order_id, email))
-        result = cursor.fetchone()
-        conn.close()
+        with DatabaseManager.get_connection() as conn:
+            result = fetch_order(conn, order_id, email)
         
         return result
     
     @staticmethod
-    def create_complaint(order_id, user_email, topic, description):
-        """Create a new complaint"""
-        conn = DatabaseManager.get_connection()
-        cursor = conn.cursor()
-        
+    def get_user_id(email):
+        """User id for an email (cached), or None"""
+        with DatabaseManager.get_connection() as conn:
+            return resolve_user_id(conn, email)
+    
+    @staticmethod
+    async def create_complaint(order_id, user_email, topic, description):
+        """Create a new complaint, group-committed with other pending ones"""
         # First, get user_id from email
-        cursor.execute("SELECT id FROM users WHERE email = ?", (user_email,))
-        user_result = cursor.fetchone()
+        user_id = await run_db(DatabaseManager.get_user_id, user_email)
         
-        if not user_result:
-            conn.close()
+        if user_id is None:
             return None
         
-        user_id = user_result[0]
-        
-        # Insert complaint
-        query = """
-        INSERT INTO complaints (order_id, user_id, status, topic, description, created_at)
-        VALUES (?, ?, 'open', ?, ?, ?)
-        """
-        
-        cursor.execute(query, (order_id, user_id, topic, description, datetime.now()))
-        complaint_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return complaint_id
+        return await get_complaint_writer().submit_async(order_id, user_id, topic, description)
 
 
 class ActionSearchProducts(Action):
     def name(self) -> Text:
         return "action_search_products"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @metrics.instrument_action
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         search_term = next(tracker.get_latest_entity_values("search_term"), None)
-        results = []
         
         if not search_term:
             # Check if search_term slot exists
@@ -151,48 +152,17 @@ class ActionSearchProducts(Action):
             return []
         
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            print(search_term)
-            for term in search_term.split(" "):
-                print(term)
-                pattern = f"%{term}%"
-                
-                cursor.execute("""
-                    SELECT *, 
-                        (CASE WHEN name LIKE ? THEN 5 ELSE 0 END) +
-                        (CASE WHEN brand LIKE ? THEN 3 ELSE 0 END) +
-                        (CASE WHEN tags LIKE ? THEN 1 ELSE 0 END) AS relevance
-                    FROM products
-                    WHERE name LIKE ? OR brand LIKE ? OR tags LIKE ?
-                    ORDER BY relevance DESC, name
-                    LIMIT 5
-                """, (pattern, pattern, pattern, pattern, pattern, pattern))
-                
-                # results += cursor.fetchall()
-                for item in cursor.fetchall():
-                    if sum([item[:7] == res[:7] for res in  results if len(results)>0])==0:
-                        print(item, results)
-                        print("======")
-                        results.append(item)
-                
-            conn.close()
-            print(results)
-            # results = list(set(results))
+            results = await run_db(DatabaseManager.search_products_fulltext, search_term)
+            metrics.log_sampled(logger, "search_products", search_term=search_term,
+                                results=len(results))
             
             if results[:5]:
-                message = "I found these products:\n"
-                for product in results:
-                    message += (
-                        f"\n- {product[1]} by {product[2]} "
-                        f"(Price: ${product[3]:.2f}, Stock: {product[4]}, "
-                        f"Rating: {product[5]}/5)"
-                    )
-                dispatcher.utter_message(text=message)
+                dispatcher.utter_message(text=templates.render_search_results(results))
             else:
                 dispatcher.utter_message(response="utter_no_results")
                 
         except sqlite3.Error:
+            metrics.ACTION_ERRORS.inc(self.name())
             dispatcher.utter_message(text="Error searching products")
             
         return []
@@ -204,9 +174,10 @@ class ActionGetRecommendations(Action):
     def name(self) -> Text:
         return "action_get_recommendations"
     
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @metrics.instrument_action
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get preference parameters from slots
         brand = tracker.get_slot("preferred_brand")
@@ -216,7 +187,8 @@ class ActionGetRecommendations(Action):
         
         try:
             # Get recommendations based on preferences
-            products = DatabaseManager.search_products(
+            products = await run_db(
+                DatabaseManager.search_products,
                 brand=brand,
                 price_range=price_range,
                 product_type=product_type,
@@ -224,26 +196,16 @@ class ActionGetRecommendations(Action):
             )
             
             if products:
-                message = "Based on your preferences, here are my top recommendations:\n\n"
-                for i, product in enumerate(products, 1):
-                    message += f"{i}. **{product[1]}** by {product[2]}\n"
-                    message += f"   💰 ${product[3]:.2f} | ⭐ {product[5]}/5 stars\n"
-                    message += f"   🔖 {product[6]}\n\n"
-                
-                message += "These products match your criteria perfectly! Would you like more details about any of them?"
+                message = templates.render_recommendations(products)
             else:
-                message = "I couldn't find products matching all your preferences. Let me suggest some popular alternatives or you can adjust your criteria!"
-                
                 # Suggest popular products as fallback
-                popular_products = DatabaseManager.search_products()
-                if popular_products:
-                    message += "\n\nHere are some of our most popular earphones:\n\n"
-                    for product in popular_products[:3]:
-                        message += f"🎧 **{product[1]}** - ${product[3]:.2f} (⭐ {product[5]}/5)\n"
+                popular_products = await run_db(DatabaseManager.search_products)
+                message = templates.render_no_recommendations(popular_products[:3])
             
             dispatcher.utter_message(text=message)
             
         except Exception as e:
+            metrics.ACTION_ERRORS.inc(self.name())
             logger.error(f"Error getting recommendations: {str(e)}")
             dispatcher.utter_message(text="I'm sorry, I encountered an error while getting recommendations. Please try again or contact our support team.")
         
@@ -256,17 +218,16 @@ class ActionTrackOrder(Action):
     def name(self) -> Text:
         return "action_track_order"
     
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @metrics.instrument_action
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         order_id = tracker.get_slot("order_id")
         if not order_id:
             dispatcher.utter_message(text="I need your order ID to track your order.")
             return []
         
-        print("hello")
-        
         user_email = next(tracker.get_latest_entity_values("user_email"), None)
         # results = []
         
@@ -282,43 +243,18 @@ class ActionTrackOrder(Action):
         
         try:
             # Get order status
-            order = DatabaseManager.get_order_status(order_id, user_email)
+            order = await run_db(DatabaseManager.get_order_status, order_id, user_email)
+            metrics.log_sampled(logger, "track_order", order_id=order_id, found=order is not None)
             
             if order:
-                status = order[4]  # status column
-                order_amount = order[3]  # order_amount column
-                created_time = order[5]  # created_time column
-                shipping_address = order[2]  # shipping_address column
-                
-                status_emoji = {
-                    "processing": "⏳",
-                    "shipped": "🚚",
-                    "delivered": "✅",
-                    "cancelled": "❌"
-                }.get(status.lower(), "📦")
-                
-                message = f"📋 **Order Status Update**\n\n"
-                message += f"🆔 Order ID: {order_id}\n"
-                message += f"{status_emoji} Status: **{status.upper()}**\n"
-                message += f"💰 Amount: ${order_amount:.2f}\n"
-                message += f"📅 Order Date: {created_time}\n"
-                message += f"🏠 Shipping Address: {shipping_address}\n\n"
-                
-                if status.lower() == "processing":
-                    message += "Your order is being prepared and will ship soon!"
-                elif status.lower() == "shipped":
-                    message += "Your order is on its way! You should receive it in 2-3 business days."
-                elif status.lower() == "delivered":
-                    message += "Your order has been delivered! We hope you enjoy your new earphones!"
-                elif status.lower() == "cancelled":
-                    message += "Your order has been cancelled. If you have questions, please contact our support team."
-                
+                message = templates.render_order_status(order_id, order)
             else:
-                message = f"I couldn't find an order with ID {order_id} associated with email {user_email}. Please check your order ID and email address, or contact our support team for assistance."
+                message = templates.render_order_not_found(order_id, user_email)
             
             dispatcher.utter_message(text=message)
             
         except Exception as e:
+            metrics.ACTION_ERRORS.inc(self.name())
             logger.error(f"Error tracking order: {str(e)}")
             dispatcher.utter_message(text="I'm sorry, I encountered an error while tracking your order. Please contact our support team for assistance.")
         
@@ -334,9 +270,10 @@ class ActionLodgeComplaint(Action):
     def name(self) -> Text:
         return "action_lodge_complaint"
     
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @metrics.instrument_action
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         order_id = tracker.get_slot("order_id")
         dispatcher.utter_message(response="utter_ask_email")
@@ -350,7 +287,7 @@ class ActionLodgeComplaint(Action):
         
         try:
             # Create complaint
-            complaint_id = DatabaseManager.create_complaint(
+            complaint_id = await DatabaseManager.create_complaint(
                 order_id=order_id,
                 user_email=user_email,
                 topic=complaint_topic,
@@ -374,6 +311,7 @@ class ActionLodgeComplaint(Action):
             dispatcher.utter_message(text=message)
             
         except Exception as e:
+            metrics.ACTION_ERRORS.inc(self.name())
             logger.error(f"Error lodging complaint: {str(e)}")
             dispatcher.utter_message(text="I'm sorry, I encountered an error while registering your complaint. Please contact our support team directly.")
         
@@ -391,6 +329,7 @@ class ActionEscalateToHuman(Action):
     def name(self) -> Text:
         return "action_escalate_to_human"
     
+    @metrics.instrument_action
     def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
@@ -434,6 +373,7 @@ class ActionDefaultFallback(Action):
     def name(self):
         return "action_default_fallback"
 
+    @metrics.instrument_action
     def run(self, dispatcher, tracker, domain):
         dispatcher.utter_message("Sorry, I didn't understand that.")
         dispatcher.utter_message("Could you rephrase or ask something else?")
@@ -508,10 +448,8 @@ class ValidateRecommendationForm(FormValidationAction):
         domain: DomainDict,
     ) -> Dict[Text, Any]:
         """Validate price_range slot"""
-        if slot_value:
-            price_keywords = ["under", "$", "budget", "cheap", "expensive", "premium", "-"]
-            if any(keyword in slot_value.lower() for keyword in price_keywords):
-                return {"price_range": slot_value}
+        if slot_value and not parse_price_range(slot_value).is_open:
+            return {"price_range": slot_value}
         
         return {"price_range": "any"}
     
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Bounded LRU caches with TTL for product search, recommendations and
+email -> user id lookups
+Shared by the action server and the FastAPI backend
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from . import metrics
+from .db import ChangeWatcher, fetch_all, get_change_watcher, get_primary_watcher
+from .fuzzy import edit_distance, max_edits
+from .queries import PRODUCTS_BY_IDS
+from .snapshot import get_read_pool
+
+# Maximum cached result sets per process
+CACHE_SIZE = int(os.environ.get("EARPHONES_CACHE_SIZE", "1024"))
+
+# Seconds a cached result stays valid
+CACHE_TTL = float(os.environ.get("EARPHONES_CACHE_TTL", "60"))
+
+# email -> user id mappings kept per process, and for how long
+USER_CACHE_SIZE = int(os.environ.get("EARPHONES_USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("EARPHONES_USER_CACHE_TTL", "300"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# Given the ids of written rows, a predicate for the entries to drop
+ChangeFilter = Callable[[Set[int]], Callable[[Hashable, Any], bool]]
+
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds
+
+    When ``table`` is given the cache follows writes to that table through
+    the shared ChangeWatcher (or the one ``watcher`` returns): ``on_change`` receives the ids of the written
+    rows and decides which entries they affect. Without ``on_change``, or
+    when the watcher can't tell which rows changed, the whole cache is
+    dropped.
+    """
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 table: Optional[str] = None, on_change: Optional[ChangeFilter] = None,
+                 watcher: Callable[[], ChangeWatcher] = get_change_watcher):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.table = table
+        self.on_change = on_change
+        self.watcher = watcher
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        # Keys being computed by get_or_compute, for callers missing the same key
+        self._pending: Dict[Hashable, Future] = {}
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def _pending_change(self) -> Optional[Tuple[int, Optional[Set[int]], Any]]:
+        """(version, changed ids, entry predicate) when the table has moved on
+
+        Runs before the lock is taken: polling the watcher and building the
+        predicate (``on_change`` may query the database) must not hold up
+        other users of the cache.
+        """
+        if self.table is None:
+            return None
+        watcher = self.watcher()
+        version = watcher.version(self.table)
+        since = self._version
+        if version == since:
+            return None
+        changed = watcher.changes_since(self.table, since) if self.on_change else None
+        affected = self.on_change(changed) if changed and self._entries else None
+        return version, changed, affected
+
+    def _apply_change(self, version: int, changed: Optional[Set[int]], affected: Any) -> None:
+        # Versions only grow and the ids cover everything since the version
+        # read before, so a change is either already applied or still needed
+        if self._version is not None and self._version >= version:
+            return
+        if changed is None or (changed and affected is None):
+            # Unknown rows, or entries added since the predicate was skipped
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+        elif changed:
+            stale = [key for key, (_, value) in self._entries.items() if affected(key, value)]
+            for key in stale:
+                del self._entries[key]
+            self.dropped += len(stale)
+        self._version = version
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        change = self._pending_change()
+        with self._lock:
+            if change is not None:
+                self._apply_change(*change)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        change = self._pending_change()
+        with self._lock:
+            if change is not None:
+                self._apply_change(*change)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached value for key, computing and storing it on a miss
+
+        Concurrent misses on one key run ``compute`` once; the other callers
+        wait for its result (or its exception).
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def invalidate(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+_MISSING = object()
+
+
+def normalize_terms(text: Optional[str]) -> Tuple[str, ...]:
+    """Lower-cased, de-duplicated, sorted search terms
+
+    Punctuation inside a term is folded to spaces ("Audio-Technica" ->
+    "audio technica") but terms are kept whole, matching how the full-text
+    query treats each whitespace-separated term as one phrase.
+    """
+    if not text:
+        return ()
+    terms = set()
+    for term in text.lower().split():
+        words = _TOKEN_RE.findall(term)
+        if words:
+            terms.add(" ".join(words))
+    return tuple(sorted(terms))
+
+
+def search_key(search_term: str, limit: int) -> Tuple:
+    """Cache key for a free-text product search"""
+    return ("search", normalize_terms(search_term), limit)
+
+
+def recommendation_key(query: Optional[str], brand: Optional[str],
+                       min_price: Optional[float], max_price: Optional[float],
+                       tag_terms: Iterable[str], limit: int) -> Tuple:
+    """Cache key for a structured product filter"""
+    query = query.strip().lower() if query else None
+    brand = brand.strip().lower() if brand else None
+    return ("filter", query or None, brand or None, min_price, max_price,
+            tuple(sorted(set(tag_terms))), limit)
+
+
+def _row_words(row: Tuple) -> List[str]:
+    return _TOKEN_RE.findall(f"{row[1]} {row[2]} {row[6]}".lower())
+
+
+def _terms_may_match(terms: Iterable[str], words: List[str]) -> bool:
+    """Whether any search word is a prefix of, or a typo away from, a product word"""
+    for term in terms:
+        for query_word in term.split():
+            edits = max_edits(query_word)
+            for word in words:
+                if word.startswith(query_word) or (
+                        edits and edit_distance(query_word, word, edits) <= edits):
+                    return True
+    return False
+
+
+def _may_match(key: Hashable, row: Tuple) -> bool:
+    """Whether a product row could be among the results cached under ``key``
+
+    Loose on purpose (prices and tags are compared without the exact SQL
+    semantics), so it errs towards dropping an entry.
+    """
+    kind = key[0] if isinstance(key, tuple) and key else None
+    if kind == "search":
+        return _terms_may_match(key[1], _row_words(row))
+    if kind == "filter":
+        _, query, brand, min_price, max_price, tags, _ = key
+        terms = normalize_terms(query)
+    elif kind == "api_search":
+        _, terms, brand, price, tags = key
+        min_price, max_price = price.min_price, price.max_price
+    else:
+        return True
+    if brand and row[2].lower() != brand.lower():
+        return False
+    if (min_price is not None and row[3] < min_price) or \
+            (max_price is not None and row[3] > max_price):
+        return False
+    if any(tag not in row[6].lower() for tag in tags):
+        return False
+    return not terms or _terms_may_match(terms, _row_words(row))
+
+
+def product_entry_filter(ids: Set[int]) -> Callable[[Hashable, Any], bool]:
+    """Product cache entries a write to the ``ids`` products may have changed
+
+    An entry is stale when it holds one of those products, or when one of
+    them now matches its criteria and so may belong in the results.
+    """
+    with get_read_pool().connection() as conn:
+        rows = fetch_all(conn, PRODUCTS_BY_IDS, (json.dumps(sorted(ids)),))
+
+    def affected(key: Hashable, value: Any) -> bool:
+        if not isinstance(value, tuple):
+            return True
+        return any(r[0] in ids for r in value) or any(_may_match(key, row) for row in rows)
+
+    return affected
+
+
+def user_entry_filter(ids: Set[int]) -> Callable[[Hashable, Any], bool]:
+    """email -> user id entries of the written users"""
+    return lambda email, user_id: user_id in ids
+
+
+_cache: Optional[ResultCache] = None
+_user_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_product_cache() -> ResultCache:
+    """Process-wide product result cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(table="products", on_change=product_entry_filter)
+    return _cache
+
+
+def _cache_metrics():
+    caches = [(name, cache) for name, cache in (("product", _cache), ("user", _user_cache))
+              if cache is not None]
+    families = []
+    for field, kind, help in (
+        ("hits", "counter", "Cache lookups answered from the cache"),
+        ("misses", "counter", "Cache lookups that had to be computed"),
+        ("evictions", "counter", "Entries dropped to stay within max_size"),
+        ("expirations", "counter", "Entries dropped after their TTL"),
+        ("invalidations", "counter", "Whole-cache drops after a change to unknown rows"),
+        ("dropped", "counter", "Entries dropped because rows they depend on were written"),
+        ("coalesced", "counter", "Misses that waited for another caller computing the same key"),
+        ("size", "gauge", "Entries currently cached"),
+        ("hit_ratio", "gauge", "hits / (hits + misses) since start"),
+    ):
+        name = f"earphones_cache_{field}" + ("_total" if kind == "counter" else "")
+        families.append((name, kind, help,
+                         [({"cache": label}, cache.stats()[field]) for label, cache in caches]))
+    return families
+
+
+metrics.register_collector(_cache_metrics)
+
+
+def get_user_cache() -> ResultCache:
+    """Process-wide email -> user id cache (entries expire, misses aren't cached)"""
+    global _user_cache
+    if _user_cache is None:
+        with _cache_lock:
+            if _user_cache is None:
+                # User ids are read from the primary, so follow its writes
+                _user_cache = ResultCache(USER_CACHE_SIZE, USER_CACHE_TTL,
+                                          table="users", on_change=user_entry_filter,
+                                          watcher=get_primary_watcher)
+    return _user_cache
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+In-process columnar product catalog for recommendations
+Keeps the products table in NumPy arrays and answers brand/price/type/feature
+filters with vectorized masks instead of a SQLite round trip per turn
+"""
+
+import copy
+import json
+import os
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # catalog is optional - callers fall back to SQL
+    np = None
+
+from .db import fetch_all, get_change_watcher
+from .queries import ALL_PRODUCTS, PRODUCTS_BY_IDS
+from .snapshot import get_read_pool
+
+logger = logging.getLogger(__name__)
+
+# Set EARPHONES_CATALOG=0 to always query SQLite directly
+CATALOG_ENABLED = os.environ.get("EARPHONES_CATALOG", "1") != "0"
+
+# Per-row arrays of a snapshot, patched together on incremental refreshes
+_COLUMNS = ("ids", "price", "stock", "rating", "brand_codes", "tag_matrix")
+
+
+def _row_tags(row: Tuple) -> List[str]:
+    return [t.strip().lower() for t in row[6].split(",") if t.strip()]
+
+
+class _Snapshot:
+    """Immutable column arrays for one version of the products table"""
+
+    def __init__(self, rows: List[Tuple]):
+        self.rows = rows
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.price = np.array([r[3] for r in rows], dtype=np.float64)
+        self.stock = np.array([r[4] for r in rows], dtype=np.int64)
+        self.rating = np.array([r[5] for r in rows], dtype=np.float64)
+        self.positions: Dict[int, int] = {r[0]: i for i, r in enumerate(rows)}
+
+        # Brands are dictionary-encoded: one code per row, matched via the
+        # (small) list of distinct brand names
+        self.brands: List[str] = sorted({r[2].lower() for r in rows})
+        brand_index = {b: i for i, b in enumerate(self.brands)}
+        self.brand_codes = np.array([brand_index[r[2].lower()] for r in rows],
+                                    dtype=np.int32)
+
+        # Tag bitset matrix: row i, column j set when product i has tag j
+        tag_lists = [_row_tags(r) for r in rows]
+        self.tags: List[str] = sorted({t for tags in tag_lists for t in tags})
+        self.tag_index = {t: j for j, t in enumerate(self.tags)}
+        self.tag_matrix = np.zeros((len(rows), len(self.tags)), dtype=bool)
+        for i, tags in enumerate(tag_lists):
+            for t in tags:
+                self.tag_matrix[i, self.tag_index[t]] = True
+
+    def patched(self, ids: Set[int], rows: List[Tuple]) -> "_Snapshot":
+        """This snapshot with the ``ids`` products replaced by ``rows``
+
+        Ids without a row were deleted. The arrays are copied and patched
+        by position rather than rebuilt, and this snapshot is left as it was
+        for searches still running on it. Brands and tags no product uses
+        any more keep their (empty) codes and columns until a full reload.
+        """
+        new = copy.copy(self)
+        new.rows = list(self.rows)
+        for name in _COLUMNS:
+            setattr(new, name, getattr(self, name).copy())
+        new.brands = list(self.brands)
+        new.tags = list(self.tags)
+        new.tag_index = dict(self.tag_index)
+
+        by_id = {r[0]: r for r in rows}
+        deleted = [i for i in ids if i in self.positions and i not in by_id]
+        added = sorted(i for i in by_id if i not in self.positions)
+        for product_id, row in by_id.items():
+            if product_id in self.positions:
+                new._put(self.positions[product_id], row)
+
+        if deleted or added:
+            keep = np.ones(len(self.rows), dtype=bool)
+            keep[[self.positions[i] for i in deleted]] = False
+            new.rows = [r for r, kept in zip(new.rows, keep) if kept] + [None] * len(added)
+            for name in _COLUMNS:
+                kept = getattr(new, name)[keep]
+                padding = np.zeros((len(added),) + kept.shape[1:], dtype=kept.dtype)
+                setattr(new, name, np.concatenate([kept, padding]))
+            base = int(keep.sum())
+            for offset, product_id in enumerate(added):
+                new._put(base + offset, by_id[product_id])
+            # Keep id order (as ALL_PRODUCTS returns it) for ties in rating
+            order = np.argsort(new.ids, kind="stable")
+            if added and (order != np.arange(len(order))).any():
+                new.rows = [new.rows[i] for i in order]
+                for name in _COLUMNS:
+                    setattr(new, name, getattr(new, name)[order])
+            new.positions = {int(product_id): i for i, product_id in enumerate(new.ids)}
+        return new
+
+    def _put(self, pos: int, row: Tuple) -> None:
+        """Write one product row into position ``pos`` of every column"""
+        brand = row[2].lower()
+        if brand not in self.brands:
+            self.brands.append(brand)
+        columns = []
+        for tag in _row_tags(row):
+            col = self.tag_index.get(tag)
+            if col is None:
+                col = self.tag_index[tag] = len(self.tags)
+                self.tags.append(tag)
+                self.tag_matrix = np.hstack(
+                    [self.tag_matrix, np.zeros((len(self.tag_matrix), 1), dtype=bool)])
+            columns.append(col)
+        self.rows[pos] = row
+        self.ids[pos] = row[0]
+        self.price[pos] = row[3]
+        self.stock[pos] = row[4]
+        self.rating[pos] = row[5]
+        self.brand_codes[pos] = self.brands.index(brand)
+        self.tag_matrix[pos] = False
+        self.tag_matrix[pos, columns] = True
+
+    def filter(self, brand: Optional[str], min_price: Optional[float],
+               max_price: Optional[float], tag_terms: Iterable[str],
+               limit: int) -> List[Tuple]:
+        mask = np.ones(len(self.rows), dtype=bool)
+
+        if brand:
+            try:
+                mask &= self.brand_codes == self.brands.index(brand.lower())
+            except ValueError:
+                return []
+
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+
+        for tag in tag_terms:
+            col = self.tag_index.get(tag)
+            if col is None:
+                return []
+            mask &= self.tag_matrix[:, col]
+
+        idx = np.flatnonzero(mask)
+        if len(idx) > limit:
+            top = np.argpartition(-self.rating[idx], limit - 1)[:limit]
+            idx = idx[top]
+        idx = idx[np.argsort(-self.rating[idx], kind="stable")]
+        return [self.rows[i] for i in idx]
+
+
+class ProductCatalog:
+    """Process-local catalog that follows writes to the products table
+
+    Written products are fetched and patched into a copy of the arrays;
+    the whole table is reloaded only when the ChangeWatcher can't tell
+    which rows changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._version: Optional[int] = None
+        self.reloads = 0
+        self.patches = 0
+
+    def refresh(self, force: bool = False) -> None:
+        """Catch up with products written since the last look"""
+        watcher = get_change_watcher()
+        version = watcher.version()
+        if not force and version == self._version:
+            return
+        with self._lock:
+            if not force and version == self._version:
+                return
+            ids = None
+            if not force and self._snapshot is not None:
+                ids = watcher.changes_since("products", self._version)
+            with get_read_pool().connection() as conn:
+                if ids is None:
+                    rows = fetch_all(conn, ALL_PRODUCTS)
+                elif ids:
+                    rows = fetch_all(conn, PRODUCTS_BY_IDS, (json.dumps(sorted(ids)),))
+            if ids is None:
+                self._snapshot = _Snapshot(rows)
+                self.reloads += 1
+                logger.info(f"Loaded {len(rows)} products into the in-memory catalog")
+            elif ids:
+                self._snapshot = self._snapshot.patched(ids, rows)
+                self.patches += 1
+            self._version = version
+
+    def search(self, brand: Optional[str] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, tag_terms: Iterable[str] = (),
+               limit: int = 5) -> List[Tuple]:
+        """Top products by rating matching all filters (rows as in SELECT *)"""
+        self.refresh()
+        return self._snapshot.filter(brand, min_price, max_price, tag_terms, limit)
+
+    def stats(self) -> Dict[str, int]:
+        snapshot = self._snapshot
+        return {
+            "products": len(snapshot.rows) if snapshot else 0,
+            "tags": len(snapshot.tags) if snapshot else 0,
+            "reloads": self.reloads,
+            "patches": self.patches,
+        }
+
+
+_catalog: Optional[ProductCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Optional[ProductCatalog]:
+    """Shared catalog, or None when disabled or NumPy is not installed"""
+    global _catalog
+    if np is None or not CATALOG_ENABLED:
+        return None
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ProductCatalog()
+    return _catalog
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite connection pool for the Earphones Store Chatbot
+Used by both the action server and the FastAPI backend
+"""
+
+import asyncio
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from . import metrics
+from .queries import CHANGES_SINCE, LATEST_CHANGE, PRODUCTS_FINGERPRINT, query_name
+
+logger = logging.getLogger(__name__)
+
+# Database path (relative to the directory the server is started from)
+DB_PATH = os.environ.get("EARPHONES_DB_PATH", "../data/earphones_store.db")
+
+# Maximum number of open connections per process
+POOL_SIZE = int(os.environ.get("EARPHONES_DB_POOL_SIZE", "8"))
+
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.environ.get("EARPHONES_DB_POOL_TIMEOUT", "5.0"))
+
+# Threads running blocking DB calls for async callers (0 = run inline on
+# the event loop, i.e. the old blocking behaviour)
+EXECUTOR_WORKERS = int(os.environ.get("EARPHONES_DB_EXECUTOR_WORKERS", str(POOL_SIZE)))
+
+# Minimum seconds between checks for committed changes to the cached tables
+WATCH_INTERVAL = float(os.environ.get("EARPHONES_DB_WATCH_INTERVAL", "0.5"))
+
+# Recent change_log entries remembered per process; consumers further behind
+# than this drop their whole cache
+CHANGE_HISTORY = int(os.environ.get("EARPHONES_CHANGE_HISTORY", "10000"))
+
+# change_log row id meaning "any row of the table" (written after bulk loads)
+WHOLE_TABLE = 0
+
+# Prepared statements kept per connection (the query registry holds ~25)
+STATEMENT_CACHE = int(os.environ.get("EARPHONES_DB_STATEMENT_CACHE", "256"))
+
+# Pragmas applied to every new connection
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers don't block the writer
+    "PRAGMA synchronous=NORMAL",      # fsync on checkpoint only (safe with WAL)
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA cache_size=-16000",       # ~16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    """Raised when no connection becomes free within the pool timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of reusable SQLite connections
+
+    Connections are created lazily up to ``size`` and handed back to the
+    idle queue after each use, so a worker thread reuses a warm connection
+    instead of paying connect/schema-parse/page-cache warmup per query.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, size: int = POOL_SIZE,
+                 timeout: float = POOL_TIMEOUT, uri: bool = False,
+                 pragmas: Sequence[str] = PRAGMAS):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.uri = uri
+        self.pragmas = pragmas
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE, uri=self.uri)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take a connection from the pool, opening one if below capacity"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+            self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            self.misses += 1
+            return conn
+
+        # Pool is at capacity - wait for another thread to release
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted(
+                f"No database connection available after {self.timeout}s "
+                f"(pool size {self.size})"
+            )
+        finally:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - start
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn: sqlite3.Connection) -> None:
+        """Drop a broken connection instead of returning it"""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+            self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close all idle connections; busy ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool hit/miss/wait counters"""
+        return {
+            "size": self.size,
+            "open": self._created,
+            "idle": self._idle.qsize(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "wait_time_seconds": round(self.wait_time, 6),
+        }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, recreated after fork so workers never share handles"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool()
+                _pool_pid = pid
+                logger.info(f"Opened SQLite pool for {DB_PATH} (size {_pool.size})")
+    return _pool
+
+
+def close_pool() -> None:
+    """Close the process-wide pool"""
+    global _pool, _pool_pid, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
+def _pool_metrics():
+    if _pool is None:
+        return []
+    stats = _pool.stats()
+    return [
+        ("earphones_db_pool_connections", "gauge", "Open pooled connections",
+         [({"state": "open"}, stats["open"]), ({"state": "idle"}, stats["idle"])]),
+        ("earphones_db_pool_acquires_total", "counter", "Connection checkouts",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("earphones_db_pool_waits_total", "counter", "Checkouts that had to wait",
+         [({}, stats["waits"])]),
+        ("earphones_db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection",
+         [({}, stats["wait_time_seconds"])]),
+    ]
+
+
+metrics.register_collector(_pool_metrics)
+
+
+# Instrumented query helpers ----------------------------------------------
+
+def _timed(conn: sqlite3.Connection, sql: str, params: Sequence, fetch: Callable) -> Any:
+    if not metrics.ENABLED:
+        return fetch(conn.execute(sql, params))
+    name = query_name(sql)
+    start = time.perf_counter()
+    try:
+        cursor = conn.execute(sql, params)
+        result = fetch(cursor)
+    except sqlite3.Error:
+        metrics.QUERY_ERRORS.inc(name)
+        raise
+    metrics.QUERY_LATENCY.observe(time.perf_counter() - start, name)
+    if isinstance(result, list):
+        rows = len(result)
+    elif isinstance(result, sqlite3.Cursor):
+        rows = max(result.rowcount, 0)
+    else:
+        rows = int(result is not None)
+    metrics.QUERY_ROWS.observe(rows, name)
+    return result
+
+
+def fetch_all(conn: sqlite3.Connection, sql: str, params: Sequence = ()) -> List[tuple]:
+    """conn.execute(sql, params).fetchall(), timed under the query's registered name"""
+    return _timed(conn, sql, params, sqlite3.Cursor.fetchall)
+
+
+def fetch_one(conn: sqlite3.Connection, sql: str, params: Sequence = ()) -> Optional[tuple]:
+    """conn.execute(sql, params).fetchone(), timed under the query's registered name"""
+    return _timed(conn, sql, params, sqlite3.Cursor.fetchone)
+
+
+def execute(conn: sqlite3.Connection, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+    """conn.execute(sql, params) for writes, timed with rowcount as the rows figure"""
+    return _timed(conn, sql, params, lambda cursor: cursor)
+
+
+class ChangeWatcher:
+    """Detects committed writes to products, orders and users from any connection
+
+    Polls ``PRAGMA data_version`` on a dedicated connection (the value only
+    moves when another connection commits), then reads the change_log
+    entries the setup_database.py triggers add for every written row. A
+    table's version is the change_log version of its latest write.
+    Consumers compare ``version(table)`` with the value they last saw and
+    ask ``changes_since()`` which rows to invalidate. Databases without a
+    change_log fall back to a cheap aggregate over products, and every
+    change is then reported as unknown rows.
+
+    With ``snapshots`` (a SnapshotManager) the watcher reads the current
+    read-only snapshot instead of the primary, so caches filled from the
+    snapshot only move on once it has the change.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, interval: float = WATCH_INTERVAL,
+                 history: int = CHANGE_HISTORY, snapshots: Optional[Any] = None):
+        self.db_path = db_path
+        self.interval = interval
+        self.snapshots = snapshots
+        self._generation: Optional[Any] = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._has_log = False
+        self._fingerprint: Optional[tuple] = None
+        self._versions: Dict[str, int] = defaultdict(int)
+        # (version, table, row id) of the latest changes, oldest first
+        self._recent: "deque[Tuple[int, str, int]]" = deque(maxlen=history)
+        self._last_change = 0
+        self._floor = 0     # changes up to this version can't be listed any more
+        self._last_check = float("-inf")
+
+    def _poll(self) -> None:
+        now = time.monotonic()
+        if now - self._last_check < self.interval:
+            return
+        self._last_check = now
+
+        if self.snapshots is not None:
+            generation = self.snapshots.generation()
+            if generation != self._generation:
+                # A new snapshot file: carry on from the last change seen
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                self._data_version = None
+                self._generation = generation
+        if self._conn is None:
+            if self.snapshots is not None:
+                self._conn = sqlite3.connect(self.snapshots.uri(), uri=True,
+                                             check_same_thread=False)
+            else:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._has_log = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'"
+            ).fetchone() is not None
+            if self._has_log and not self._started:
+                start = self._conn.execute(LATEST_CHANGE).fetchone()[0]
+                self._last_change = self._floor = start
+                # Tables not written since start-up are as of the latest change
+                self._versions = defaultdict(lambda: start)
+            self._started = True
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        if not self._has_log:
+            fingerprint = self._conn.execute(PRODUCTS_FINGERPRINT).fetchone()
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._versions["products"] += 1
+            return
+        changes = self._conn.execute(CHANGES_SINCE, (self._last_change,)).fetchall()
+        if not changes:
+            return
+        if changes[0][0] > self._last_change + 1:
+            # Trimmed from change_log before this process read them
+            self._floor = changes[0][0] - 1
+        for change in changes:
+            if len(self._recent) == self._recent.maxlen:
+                self._floor = self._recent[0][0]
+            self._recent.append(change)
+            self._versions[change[1]] = change[0]
+        self._last_change = changes[-1][0]
+
+    def version(self, table: str = "products") -> int:
+        """Current version of a table, re-checked at most once per interval"""
+        with self._lock:
+            self._poll()
+            return self._versions[table]
+
+    def changes_since(self, table: str, version: Optional[int]) -> Optional[Set[int]]:
+        """Ids of the rows of ``table`` written after ``version``
+
+        None when that can't be told (no change_log, a bulk load, or the
+        changes are older than the history kept): drop everything instead.
+        """
+        with self._lock:
+            if not self._has_log or version is None or version < self._floor:
+                return None
+            ids = set()
+            for change_version, change_table, row_id in reversed(self._recent):
+                if change_version <= version:
+                    break
+                if change_table == table:
+                    if row_id == WHOLE_TABLE:
+                        return None
+                    ids.add(row_id)
+            return ids
+
+    def bump(self) -> None:
+        """Check for changes on the next version() call (after a write by this process)"""
+        with self._lock:
+            self._last_check = float("-inf")
+
+
+_watcher: Optional[ChangeWatcher] = None
+
+
+def get_change_watcher() -> ChangeWatcher:
+    """Process-wide change watcher (following the snapshot when reads use one)"""
+    global _watcher
+    if _watcher is None:
+        from .snapshot import SNAPSHOT_ENABLED, get_snapshots
+
+        snapshots = get_snapshots() if SNAPSHOT_ENABLED else None
+        with _pool_lock:
+            if _watcher is None:
+                _watcher = ChangeWatcher(snapshots=snapshots)
+    return _watcher
+
+
+_primary_watcher: Optional[ChangeWatcher] = None
+
+
+def get_primary_watcher() -> ChangeWatcher:
+    """Change watcher on the primary, for caches of data read from it (users)
+
+    The same watcher as get_change_watcher() unless catalog reads use the
+    snapshot, which lags the primary by up to the refresh interval.
+    """
+    global _primary_watcher
+    from .snapshot import SNAPSHOT_ENABLED
+
+    if not SNAPSHOT_ENABLED:
+        return get_change_watcher()
+    if _primary_watcher is None:
+        with _pool_lock:
+            if _primary_watcher is None:
+                _primary_watcher = ChangeWatcher()
+    return _primary_watcher
+
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+
+
+def get_executor() -> Optional[ThreadPoolExecutor]:
+    """Bounded thread pool for blocking DB work, sized to match the connection pool"""
+    global _executor, _executor_pid
+    if EXECUTOR_WORKERS <= 0:
+        return None
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _pool_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS,
+                                               thread_name_prefix="db")
+                _executor_pid = pid
+    return _executor
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking DB call without stalling the event loop"""
+    executor = get_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
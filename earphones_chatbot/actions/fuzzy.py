@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Typo-tolerant product lookup over a precomputed deletion index
+(SymSpell-style). Product names and brands are split into words; every
+distinct word is indexed under each string reachable by deleting up to
+one character (two for long words). A misspelled query word
+("senheiser", "wirelss") finds its candidates by looking up its own
+deletions, which covers one insertion, deletion, substitution or
+transposition per edit allowed. Each word keeps the products containing
+it in rating order, and products are ranked by how well they cover the
+query. Used when full-text search finds nothing; the index follows
+products table changes, re-indexing only the rows the change log names.
+"""
+
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+
+from .db import fetch_all, get_change_watcher
+from .queries import ALL_PRODUCTS, PRODUCTS_BY_IDS
+from .snapshot import get_read_pool
+
+logger = logging.getLogger(__name__)
+
+# Set EARPHONES_FUZZY=0 to turn off the typo-tolerant fallback
+FUZZY_ENABLED = os.environ.get("EARPHONES_FUZZY", "1") != "0"
+
+# Words at least this long tolerate two edits instead of one
+LONG_WORD = 8
+
+# Words shorter than this are only matched exactly (too many near misses)
+MIN_FUZZY_LENGTH = 4
+
+# Closest indexed words tried per query word
+WORD_CANDIDATES = 3
+
+# Products read per matched word (best rated first). Keeps lookups well
+# under a millisecond for words shared by a large part of the catalog, at
+# the cost of only ranking the best rated products of such words
+MAX_POSTINGS = 256
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def max_edits(word: str) -> int:
+    if len(word) < MIN_FUZZY_LENGTH:
+        return 0
+    return 2 if len(word) >= LONG_WORD else 1
+
+
+def deletions(word: str, edits: int) -> Set[str]:
+    """``word`` with every choice of up to ``edits`` characters removed"""
+    out = {word}
+    for n in range(1, edits + 1):
+        for drop in combinations(range(len(word)), n):
+            out.add("".join(c for i, c in enumerate(word) if i not in drop))
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+def product_words(row: Tuple) -> Set[str]:
+    """Indexed words of a product row: name and brand"""
+    return set(_WORD_RE.findall(f"{row[1]} {row[2]}".lower()))
+
+
+class FuzzyIndex:
+    """Deletion index over the words of product names and brands"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[int, Tuple] = {}
+        # word -> [(-rating, product id)] kept sorted, best rated first
+        self._postings: Dict[str, List[Tuple[float, int]]] = {}
+        # deletion -> indexed words it was derived from
+        self._by_deletion: Dict[str, Set[str]] = defaultdict(set)
+        # word -> ids of its MAX_POSTINGS best rated products (built on demand)
+        self._top_ids: Dict[str, List[int]] = {}
+        self._version: Optional[int] = None
+        self.updates = 0
+
+    # Maintenance ------------------------------------------------------------
+
+    def _add(self, row: Tuple) -> None:
+        key = (-row[5], row[0])
+        for word in product_words(row):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = []
+                for variant in deletions(word, max_edits(word)):
+                    self._by_deletion[variant].add(word)
+            bisect.insort(postings, key)
+            self._top_ids.pop(word, None)
+        self._rows[row[0]] = row
+
+    def _remove(self, row: Tuple) -> None:
+        key = (-row[5], row[0])
+        for word in product_words(row):
+            postings = self._postings[word]
+            del postings[bisect.bisect_left(postings, key)]
+            self._top_ids.pop(word, None)
+            if not postings:
+                del self._postings[word]
+                for variant in deletions(word, max_edits(word)):
+                    words = self._by_deletion[variant]
+                    words.discard(word)
+                    if not words:
+                        del self._by_deletion[variant]
+        del self._rows[row[0]]
+
+    def apply(self, rows: List[Tuple]) -> int:
+        """Bring the index in line with the current products; returns rows changed"""
+        current = {row[0]: row for row in rows}
+        changed = 0
+        for product_id, row in list(self._rows.items()):
+            new = current.get(product_id)
+            if new != row:
+                self._remove(row)
+                changed += 1
+        for product_id, row in current.items():
+            if product_id not in self._rows:
+                self._add(row)
+                changed += 1
+        return changed
+
+    def apply_changes(self, ids: Set[int], rows: List[Tuple]) -> int:
+        """Re-index the ``ids`` products from their current ``rows`` (absent = deleted)"""
+        current = {row[0]: row for row in rows}
+        changed = 0
+        for product_id in ids:
+            old, new = self._rows.get(product_id), current.get(product_id)
+            if old == new:
+                continue
+            if old is not None:
+                self._remove(old)
+            if new is not None:
+                self._add(new)
+            changed += 1
+        return changed
+
+    def refresh(self) -> None:
+        """Catch up with products written since the last look"""
+        watcher = get_change_watcher()
+        version = watcher.version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            ids = watcher.changes_since("products", self._version)
+            with get_read_pool().connection() as conn:
+                if ids is None:
+                    changed = self.apply(fetch_all(conn, ALL_PRODUCTS))
+                else:
+                    rows = fetch_all(conn, PRODUCTS_BY_IDS, (json.dumps(sorted(ids)),))
+                    changed = self.apply_changes(ids, rows)
+            self._version = version
+            self.updates += 1
+            logger.info(f"Fuzzy product index updated: {changed} products changed, "
+                        f"{len(self._postings)} words")
+
+    # Lookup -------------------------------------------------------------------
+
+    def similar_words(self, word: str) -> List[Tuple[str, float]]:
+        """Indexed words within the allowed edits of ``word``, best first"""
+        if word in self._postings:
+            return [(word, 1.0)]
+        edits = max_edits(word)
+        if not edits:
+            return []
+        candidates: Set[str] = set()
+        for variant in deletions(word, edits):
+            candidates.update(self._by_deletion.get(variant, ()))
+        scored = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, edits)
+            if distance <= edits:
+                scored.append((candidate, 1 - distance / max(len(word), len(candidate))))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:WORD_CANDIDATES]
+
+    def _top(self, word: str) -> List[int]:
+        ids = self._top_ids.get(word)
+        if ids is None:
+            ids = self._top_ids[word] = [p for _, p in self._postings[word][:MAX_POSTINGS]]
+        return ids
+
+    def search(self, text: str, limit: int = 5) -> List[Tuple]:
+        """Product rows best covering the words of ``text`` (rows as in SELECT *)"""
+        self.refresh()
+        with self._lock:
+            scores: Dict[int, float] = {}
+            for word in dict.fromkeys(_WORD_RE.findall(text.lower())):
+                # Weakest candidate first, so closer words overwrite its similarity
+                best: Dict[int, float] = {}
+                for candidate, similarity in reversed(self.similar_words(word)):
+                    best.update(dict.fromkeys(self._top(candidate), similarity))
+                if not scores:
+                    scores = best
+                    continue
+                for product_id, similarity in best.items():
+                    scores[product_id] = scores.get(product_id, 0.0) + similarity
+            rows = self._rows
+            ranked = heapq.nsmallest(limit, scores, key=lambda p: (-scores[p], -rows[p][5], p))
+            return [rows[p] for p in ranked]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "products": len(self._rows),
+            "words": len(self._postings),
+            "deletions": len(self._by_deletion),
+            "updates": self.updates,
+        }
+
+
+_index: Optional[FuzzyIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_fuzzy_index() -> Optional[FuzzyIndex]:
+    """Shared fuzzy index, or None when the fuzzy fallback is disabled"""
+    global _index
+    if not FUZZY_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FuzzyIndex()
+    return _index
+
+
+def warm_up() -> None:
+    """Build the index in a background thread so the first search doesn't wait"""
+    index = get_fuzzy_index()
+    if index is None:
+        return
+
+    def build():
+        try:
+            index.refresh()
+        except Exception as e:
+            logger.warning(f"Fuzzy product index not built at startup: {e}")
+
+    threading.Thread(target=build, name="fuzzy-index", daemon=True).start()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+In-process metrics in the Prometheus text exposition format
+Shared by the action server and the Rasa server's custom NLU components
+(each served on its own port) and the FastAPI backend (served at
+/metrics), plus sampled structured logging for the hot paths
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Set EARPHONES_METRICS=0 to skip all timing and counting
+ENABLED = os.environ.get("EARPHONES_METRICS", "1") != "0"
+
+# Fraction of hot-path events written as structured log lines (0 = off)
+LOG_SAMPLE_RATE = float(os.environ.get("EARPHONES_LOG_SAMPLE_RATE", "0"))
+
+# Port of the action server's metrics endpoint (0 = don't serve)
+METRICS_PORT = int(os.environ.get("EARPHONES_METRICS_PORT", "9102"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 10000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# A collector returns (name, type, help, [(labels, value), ...]) families
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+# Extra GET routes on the metrics port: path -> () -> (status, content type, body)
+_routes: Dict[str, Callable[[], Tuple[int, str, bytes]]] = {}
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        text = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{text}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter, one series per label combination"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in items]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with sum and count, one series per label combination"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: Any) -> None:
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        lines = []
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Add a callback whose values are read at scrape time (pool and cache stats)"""
+    _collectors.append(collector)
+
+
+def add_route(path: str, handler: Callable[[], Tuple[int, str, bytes]]) -> None:
+    """Serve another GET path next to /metrics (e.g. the action server's /ready)"""
+    _routes[path] = handler
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format"""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, help, samples in collector():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} "
+                             f"{_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+ACTION_LATENCY = Histogram(
+    "earphones_action_duration_seconds", "Custom action run time", ("action",))
+ACTION_ERRORS = Counter(
+    "earphones_action_errors_total", "Custom action runs that failed", ("action",))
+QUERY_LATENCY = Histogram(
+    "earphones_db_query_duration_seconds", "SQL execution and fetch time by registered query",
+    ("query",))
+QUERY_ROWS = Histogram(
+    "earphones_db_query_rows", "Rows returned (or changed) per query", ("query",), ROW_BUCKETS)
+QUERY_ERRORS = Counter(
+    "earphones_db_query_errors_total", "Queries that raised sqlite3.Error", ("query",))
+WRITE_BATCH_SIZE = Histogram(
+    "earphones_db_write_batch_size", "Complaints committed per group commit", (), BATCH_BUCKETS)
+NLU_MESSAGES = Counter(
+    "earphones_nlu_messages_total",
+    "Parsed messages by route (structured bypass or model) and matcher rule", ("route", "rule"))
+NLU_MODEL_LATENCY = Histogram(
+    "earphones_nlu_model_duration_seconds", "Per-message run time of the bypassable NLU models",
+    ("component",))
+NLU_SAVED = Counter(
+    "earphones_nlu_saved_seconds_total",
+    "Estimated model time skipped for bypassed messages (running mean per message)",
+    ("component",))
+HTTP_LATENCY = Histogram(
+    "earphones_http_request_duration_seconds", "Backend request handling time",
+    ("method", "route", "status"))
+
+
+def instrument_action(run: Callable) -> Callable:
+    """Decorator for an Action's run(): latency by action name, errors that escape"""
+    if not ENABLED:
+        return run
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await run(self, *args, **kwargs)
+            except Exception:
+                ACTION_ERRORS.inc(self.name())
+                raise
+            finally:
+                ACTION_LATENCY.observe(time.perf_counter() - start, self.name())
+    else:
+        @functools.wraps(run)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return run(self, *args, **kwargs)
+            except Exception:
+                ACTION_ERRORS.inc(self.name())
+                raise
+            finally:
+                ACTION_LATENCY.observe(time.perf_counter() - start, self.name())
+
+    return wrapper
+
+
+def log_sampled(log: logging.Logger, event: str, **fields: Any) -> None:
+    """Write a JSON log line for a fraction of calls (no-op when sampling is off)"""
+    if LOG_SAMPLE_RATE <= 0 or (LOG_SAMPLE_RATE < 1 and random.random() >= LOG_SAMPLE_RATE):
+        return
+    log.info(json.dumps({"event": event, **fields}, default=str))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            status, content_type, body = 200, CONTENT_TYPE, render().encode()
+        elif path in _routes:
+            status, content_type, body = _routes[path]()
+        else:
+            self.send_error(404)
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread (once per process; None if disabled or busy)"""
+    global _server
+    if not ENABLED or port <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http",
+                             daemon=True).start()
+            logger.info(f"Serving metrics on :{port}/metrics")
+    return _server
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Order and user lookups shared by the action server and the FastAPI backend
+"""
+
+import json
+import sqlite3
+from typing import List, Optional, Sequence, Tuple
+
+from .cache import get_user_cache
+from .db import fetch_all, fetch_one
+from .queries import ORDER_FOR_USER, ORDERS_FOR_EMAILS, USER_ID_BY_EMAIL
+
+
+def resolve_user_id(conn: sqlite3.Connection, email: str) -> Optional[int]:
+    """User id for an email, from the per-process cache when possible"""
+    cache = get_user_cache()
+    user_id = cache.get(email)
+    if user_id is None:
+        row = fetch_one(conn, USER_ID_BY_EMAIL, (email,))
+        if row is None:
+            return None
+        user_id = row[0]
+        cache.set(email, user_id)
+    return user_id
+
+
+def fetch_order(conn: sqlite3.Connection, order_id, email: str) -> Optional[Tuple]:
+    """Order row (see queries.ORDER_COLUMNS) if it belongs to the given email"""
+    user_id = resolve_user_id(conn, email)
+    if user_id is None:
+        return None
+    return fetch_one(conn, ORDER_FOR_USER, (order_id, user_id))
+
+
+def fetch_orders(conn: sqlite3.Connection,
+                 pairs: Sequence[Tuple[int, str]]) -> List[Optional[Tuple]]:
+    """Order rows for (order_id, email) pairs in one query, aligned with the
+    input; None where the order doesn't exist or isn't that email's"""
+    results: List[Optional[Tuple]] = [None] * len(pairs)
+    rows = fetch_all(conn, ORDERS_FOR_EMAILS, (json.dumps([list(p) for p in pairs]),))
+    for row in rows:
+        results[row[0]] = row[1:]
+    return results
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Price range parser shared by the action server and the FastAPI backend
+Turns budget expressions ("under $100", "between 100 and 200", "premium",
+"around 150 dollars") into numeric (min_price, max_price) bounds
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+# Upper/lower bounds used when a keyword comes without an amount
+DEFAULT_UNDER = 100.0
+DEFAULT_OVER = 400.0
+
+# Spread applied to "around $X"
+AROUND_SPREAD = 0.2
+
+# Price tiers for budget words (min, max)
+TIERS = (
+    (re.compile(r"\b(?:budget|cheap|cheapest|affordable|inexpensive|low[- ]?cost|entry[- ]?level)\b"),
+     (None, 100.0)),
+    (re.compile(r"\b(?:mid[- ]?range|moderate|mid[- ]?priced|average)\b"),
+     (100.0, 300.0)),
+    (re.compile(r"\b(?:premium|expensive|high[- ]?end|luxury|top[- ]?end|flagship)\b"),
+     (300.0, None)),
+)
+
+_NUM = r"\$?\s*(\d+(?:,\d{3})*(?:\.\d+)?)\s*(k\b)?"
+
+_ANY_RE = re.compile(r"^\s*(?:any|anything|no preference|no budget|doesn'?t matter|whatever|none)\s*$")
+_RANGE_RE = re.compile(r"(?:\bbetween\s+|\bfrom\s+)?" + _NUM + r"\s*(?:-|–|\bto\b|\band\b)\s*" + _NUM)
+_UNDER_RE = re.compile(
+    r"(?:\bunder\b|\bbelow\b|\bless than\b|\bup to\b|\bat most\b|\bmax(?:imum)?\b|"
+    r"\bcheaper than\b|\bno more than\b|\bwithin\b|<=?)\s*" + _NUM
+)
+_OVER_RE = re.compile(
+    r"(?:\bover\b(?!-)|\babove\b|\bmore than\b|\bat least\b|\bmin(?:imum)?\b|"
+    r"\bstarting (?:at|from)\b|\bfrom\b|>=?)\s*" + _NUM
+)
+_AROUND_RE = re.compile(r"(?:\baround\b|\babout\b|\bapprox(?:imately)?\b|\broughly\b|~)\s*" + _NUM)
+_UNDER_WORD_RE = re.compile(r"\b(?:under|below|less than)\b")
+_OVER_WORD_RE = re.compile(r"\b(?:over|above|more than)\b(?!-)")
+_BARE_RE = re.compile(_NUM)
+
+
+class PriceRange(NamedTuple):
+    """Inclusive price bounds; None means unbounded on that side"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        """True when neither bound is set (no price filter)"""
+        return self.min_price is None and self.max_price is None
+
+    def sql_bounds(self) -> Tuple[float, float]:
+        """Bounds for a `price BETWEEN ? AND ?` predicate"""
+        return (
+            self.min_price if self.min_price is not None else 0.0,
+            self.max_price if self.max_price is not None else float("inf"),
+        )
+
+
+ANY_PRICE = PriceRange()
+
+
+def _amount(number: str, thousands: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    return value * 1000 if thousands else value
+
+
+@lru_cache(maxsize=4096)
+def parse_price_range(text: Optional[str]) -> PriceRange:
+    """Parse a budget expression into a PriceRange (never raises)"""
+    if not text:
+        return ANY_PRICE
+    text = text.strip().lower()
+    if _ANY_RE.match(text):
+        return ANY_PRICE
+
+    match = _RANGE_RE.search(text)
+    if match:
+        low = _amount(match.group(1), match.group(2))
+        high = _amount(match.group(3), match.group(4))
+        return PriceRange(min(low, high), max(low, high))
+
+    match = _UNDER_RE.search(text)
+    if match:
+        return PriceRange(None, _amount(match.group(1), match.group(2)))
+
+    match = _OVER_RE.search(text)
+    if match:
+        return PriceRange(_amount(match.group(1), match.group(2)), None)
+
+    match = _AROUND_RE.search(text)
+    if match:
+        value = _amount(match.group(1), match.group(2))
+        return PriceRange(round(value * (1 - AROUND_SPREAD), 2),
+                          round(value * (1 + AROUND_SPREAD), 2))
+
+    if _UNDER_WORD_RE.search(text):
+        return PriceRange(None, DEFAULT_UNDER)
+    if _OVER_WORD_RE.search(text):
+        return PriceRange(DEFAULT_OVER, None)
+
+    for pattern, (low, high) in TIERS:
+        if pattern.search(text):
+            return PriceRange(low, high)
+
+    # A lone amount ("$200", "150 dollars") is read as a ceiling
+    match = _BARE_RE.search(text)
+    if match:
+        return PriceRange(None, _amount(match.group(1), match.group(2)))
+
+    return ANY_PRICE
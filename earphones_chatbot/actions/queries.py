@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Registry of the hot SQL statements used by the action server and backend
+
+Every query is registered once under a name with fixed SQL text, so each
+filter combination maps to the same statement string and stays in
+sqlite3's per-connection statement cache instead of being re-prepared.
+Run as a module to check the query plans against a database:
+
+    cd earphones_chatbot
+    python -m actions.queries --explain --threshold 1000
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from itertools import product
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# bm25 column weights for (name, brand, tags) - same 5/3/1 relevance
+# ordering the old LIKE scoring used
+NAME_WEIGHT = 5.0
+BRAND_WEIGHT = 3.0
+TAGS_WEIGHT = 1.0
+
+
+class Query(NamedTuple):
+    name: str
+    sql: str
+    sample_params: Tuple = ()
+    allow_scan: bool = False    # full scans expected (bulk loads, aggregates)
+    listing: bool = False       # ORDER BY ... LIMIT served by walking an index
+
+
+REGISTRY: Dict[str, Query] = {}
+_NAMES_BY_SQL: Dict[str, str] = {}
+
+
+def register(name: str, sql: str, sample_params: Tuple = (),
+             allow_scan: bool = False, listing: bool = False) -> str:
+    """Add a statement to the registry and return its SQL text"""
+    if name in REGISTRY:
+        raise ValueError(f"Query {name!r} is already registered")
+    REGISTRY[name] = Query(name, sql, sample_params, allow_scan, listing)
+    _NAMES_BY_SQL[sql] = name
+    return sql
+
+
+def query_name(sql: str) -> str:
+    """Registered name of a statement ("other" for ad-hoc SQL)"""
+    return _NAMES_BY_SQL.get(sql, "other")
+
+
+# Product filters ----------------------------------------------------------
+
+# Each optional filter is a fixed fragment; tags are passed as one JSON
+# array so the text doesn't depend on how many tags were asked for.
+# The tag filter seeks product_tags on its (tag_id, product_id) key for each
+# requested tag; the unary + keeps the planner from scanning the whole
+# product_id index just to avoid sorting for the GROUP BY
+MATCH_FILTER = "id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)"
+BRAND_FILTER = "brand = ? COLLATE NOCASE"
+PRICE_FILTER = "price BETWEEN ? AND ?"
+TAG_FILTER = """id IN (
+        SELECT pt.product_id
+        FROM product_tags pt
+        WHERE pt.tag_id IN (SELECT id FROM tags WHERE name IN (SELECT value FROM json_each(?)))
+        GROUP BY +pt.product_id
+        HAVING COUNT(*) = ?
+    )"""
+
+_FILTER_NAMES = ("match", "brand", "price", "tags")
+_FILTER_SQL = (MATCH_FILTER, BRAND_FILTER, PRICE_FILTER, TAG_FILTER)
+_FILTER_SAMPLES = (('"sony"*',), ("sony",), (0.0, 300.0), ('["wireless"]', 1))
+
+
+def _filter_name(flags: Sequence[bool]) -> str:
+    used = [n for n, on in zip(_FILTER_NAMES, flags) if on]
+    return "product_filter:" + ("+".join(used) if used else "all")
+
+
+def _register_product_filters() -> None:
+    for flags in product((False, True), repeat=len(_FILTER_NAMES)):
+        clauses = [sql for sql, on in zip(_FILTER_SQL, flags) if on]
+        where = ("\n    WHERE " + "\n      AND ".join(clauses)) if clauses else ""
+        sql = f"SELECT * FROM products{where}\n    ORDER BY rating DESC\n    LIMIT ?"
+        samples = tuple(p for s, on in zip(_FILTER_SAMPLES, flags) if on for p in s)
+        # Unfiltered, it is a top-rated listing that walks idx_products_rating
+        register(_filter_name(flags), sql, samples + (5,), listing=not any(flags))
+
+
+_register_product_filters()
+
+
+def product_filter(match: Optional[str] = None, brand: Optional[str] = None,
+                   price_bounds: Optional[Tuple[float, float]] = None,
+                   tags: Sequence[str] = (), limit: int = 5) -> Tuple[str, List]:
+    """Canonical (sql, params) for a structured product filter"""
+    flags = (bool(match), bool(brand), price_bounds is not None, bool(tags))
+    params: List = []
+    if match:
+        params.append(match)
+    if brand:
+        params.append(brand)
+    if price_bounds is not None:
+        params.extend(price_bounds)
+    if tags:
+        params.extend([json.dumps(list(tags)), len(tags)])
+    params.append(limit)
+    return REGISTRY[_filter_name(flags)].sql, params
+
+
+# Full-text search ---------------------------------------------------------
+
+PRODUCT_SEARCH = register("product_search", f"""
+    SELECT p.*
+    FROM products_fts
+    JOIN products p ON p.id = products_fts.rowid
+    WHERE products_fts MATCH ?
+    ORDER BY bm25(products_fts, {NAME_WEIGHT}, {BRAND_WEIGHT}, {TAGS_WEIGHT}), p.name
+    LIMIT ?
+""", ('"sony"* OR "wireless"*', 5))
+
+PRODUCTS_BY_IDS = register("products_by_ids", """
+    SELECT * FROM products
+    WHERE id IN (SELECT value FROM json_each(?))
+""", ("[1, 2, 3]",))
+
+# Orders and complaints ----------------------------------------------------
+
+# Columns returned for an order, in orders-table order:
+# (id, user_id, shipping_address, order_amount, status, created_time)
+ORDER_COLUMNS = "id, user_id, shipping_address, order_amount, status, created_time"
+
+ORDER_FOR_USER = register("order_for_user", f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE id = ? AND user_id = ?
+""", (111111, 1))
+
+# Batch lookup: ? is a JSON array of [order_id, email] pairs; an order is
+# returned only when its user has that email. j.key is the pair's position
+ORDERS_FOR_EMAILS = register("orders_for_emails", f"""
+    SELECT j.key, {", ".join("o." + c for c in ORDER_COLUMNS.split(", "))}
+    FROM json_each(?) j
+    JOIN orders o ON o.id = json_extract(j.value, '$[0]')
+    JOIN users u ON u.id = o.user_id AND u.email = json_extract(j.value, '$[1]')
+""", ('[[111111, "john.doe@email.com"]]',))
+
+USER_ID_BY_EMAIL = register("user_id_by_email", """
+    SELECT id FROM users WHERE email = ?
+""", ("john.doe@email.com",))
+
+INSERT_COMPLAINT = register("insert_complaint", """
+    INSERT INTO complaints (order_id, user_id, status, topic, description, created_at)
+    VALUES (?, ?, 'open', ?, ?, ?)
+""", (111111, 1, "Shipping", "Sample complaint text", "2024-06-21 10:00:00"))
+
+# Catalog maintenance (full scans by design, run only on change) -----------
+
+ALL_PRODUCTS = register("all_products", """
+    SELECT * FROM products ORDER BY id
+""", allow_scan=True)
+
+PRODUCTS_FINGERPRINT = register("products_fingerprint", """
+    SELECT count(*), max(id), total(price), total(quantity), total(rating),
+           total(length(name) + length(brand) + length(tags))
+    FROM products
+""", allow_scan=True)
+
+
+# Change log (filled by the triggers from setup_database.py) ---------------
+
+LATEST_CHANGE = register("latest_change", """
+    SELECT coalesce(max(version), 0) FROM change_log
+""")
+
+CHANGES_SINCE = register("changes_since", """
+    SELECT version, table_name, row_id FROM change_log
+    WHERE version > ?
+    ORDER BY version
+""", (0,))
+
+# Plan verification --------------------------------------------------------
+
+def table_sizes(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Row counts of all ordinary tables"""
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+    )]
+    return {n: conn.execute(f'SELECT count(*) FROM "{n}"').fetchone()[0] for n in names}
+
+
+_TABLE_REF_RE = re.compile(r"\b(?:FROM|JOIN|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b)(\w+))?",
+                           re.IGNORECASE)
+
+
+def _aliases(sql: str) -> Dict[str, str]:
+    """alias -> table for the table references in a statement"""
+    aliases = {}
+    for table, alias in _TABLE_REF_RE.findall(sql):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn: sqlite3.Connection, query: Query) -> List[Tuple[str, str]]:
+    """(table, plan line) for each scan of a whole table or index
+
+    A scan through an index still visits every row. Only listings may walk
+    an index, since their LIMIT stops the walk after the first few rows.
+    """
+    aliases = _aliases(query.sql)
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + query.sql, query.sample_params):
+        detail = row[-1]
+        if not detail.startswith("SCAN ") or "VIRTUAL TABLE" in detail:
+            continue
+        if query.listing and " INDEX " in detail:
+            continue
+        name = detail.split()[1]
+        scans.append((aliases.get(name, name), detail))
+    return scans
+
+
+def check_plans(conn: sqlite3.Connection, threshold: int,
+                verbose: bool = False) -> List[str]:
+    """Problems found in the registered queries (empty list = all good)"""
+    sizes = table_sizes(conn)
+    problems = []
+    for query in REGISTRY.values():
+        if verbose:
+            print(f"-- {query.name}")
+            for row in conn.execute("EXPLAIN QUERY PLAN " + query.sql, query.sample_params):
+                print(f"   {row[-1]}")
+        if query.allow_scan:
+            continue
+        for table, detail in full_scans(conn, query):
+            rows = sizes.get(table, 0)
+            if rows > threshold:
+                problems.append(f"{query.name}: {detail} ({rows} rows)")
+    return problems
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .db import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Check query plans of registered statements")
+    parser.add_argument("--db", default=DB_PATH, help="database to explain against")
+    parser.add_argument("--explain", action="store_true", help="print every query plan")
+    parser.add_argument("--threshold", type=int, default=1000,
+                        help="fail on full scans of tables with more rows than this")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        problems = check_plans(conn, args.threshold, verbose=args.explain)
+    finally:
+        conn.close()
+
+    for problem in problems:
+        print(f"FULL SCAN {problem}")
+    print(f"{len(REGISTRY)} queries checked, {len(problems)} problem(s)")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
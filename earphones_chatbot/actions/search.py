@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Product search helpers: full-text search backed by the products_fts (FTS5)
+index and tag filters over the normalized tags/product_tags tables
+"""
+
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+from .db import fetch_all
+from .queries import PRODUCT_SEARCH
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_EAR_TYPE_RE = re.compile(r"\b(over|in|on)[\s-]?ear\b")
+
+# Brand slot values meaning "no brand filter"
+_ANY_BRAND = {"any", "no preference", "no", "none", "doesn't matter"}
+
+
+def build_match_query(search_term: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression
+
+    Every whitespace-separated term becomes a prefix phrase (so
+    "audio-technica" matches as one phrase and "airpod" matches "AirPods")
+    and terms are OR-ed together, mirroring the old per-term search.
+    Returns None when the text has no searchable words.
+    """
+    phrases = []
+    for term in search_term.lower().split():
+        words = _WORD_RE.findall(term)
+        if words:
+            phrase = '"' + " ".join(words) + '"*'
+            if phrase not in phrases:
+                phrases.append(phrase)
+    if not phrases:
+        return None
+    return " OR ".join(phrases)
+
+
+def search_products_fulltext(conn: sqlite3.Connection, search_term: str,
+                             limit: int = 5) -> List[Tuple]:
+    """Ranked product rows matching any term of the search text"""
+    match = build_match_query(search_term)
+    if match is None:
+        return []
+    return fetch_all(conn, PRODUCT_SEARCH, (match, limit))
+
+
+def normalize_tag(term: str) -> str:
+    """Canonical tag spelling ("Noise Cancelling" -> "noise-cancelling")"""
+    return "-".join(term.lower().split())
+
+
+def parse_tag_terms(product_type: Optional[str] = None,
+                    features: Optional[str] = None) -> List[str]:
+    """Distinct tags every result must carry, from the form slots"""
+    terms = []
+    if product_type and product_type.lower() != "any":
+        # "over-ear headphones" / "in ear" -> the ear-type tag
+        match = _EAR_TYPE_RE.search(product_type.lower())
+        terms.append(f"{match.group(1)}-ear" if match else normalize_tag(product_type))
+    if features and features.lower() != "any":
+        for feature in features.split(","):
+            tag = normalize_tag(feature)
+            if tag and tag not in terms:
+                terms.append(tag)
+    return terms
+
+
+def normalize_brand(brand: Optional[str]) -> Optional[str]:
+    """Brand to filter on, or None when the user has no preference"""
+    if not brand or brand.strip().lower() in _ANY_BRAND:
+        return None
+    return brand.strip()
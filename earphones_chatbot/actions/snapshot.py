@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Read-only snapshot of the database for catalog reads
+With EARPHONES_SNAPSHOT=1, product searches, recommendations and the
+in-memory indexes read from a copy of the primary database made with the
+SQLite online backup API and opened ``mode=ro&immutable=1`` (no locking,
+no WAL checks, memory-mapped). Order lookups, user lookups and all writes
+stay on the primary. The copy is refreshed every EARPHONES_SNAPSHOT_INTERVAL
+seconds by whichever process gets the snapshot lock first; every process
+switches to a new copy when the file is replaced, while queries already
+running finish on the old one.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock - every process may refresh
+    fcntl = None
+
+from . import metrics
+from .db import DB_PATH, POOL_SIZE, ConnectionPool, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Set EARPHONES_SNAPSHOT=1 to serve catalog reads from a read-only snapshot
+SNAPSHOT_ENABLED = os.environ.get("EARPHONES_SNAPSHOT", "0") == "1"
+
+# Snapshot file (next to the primary by default)
+SNAPSHOT_PATH = os.environ.get(
+    "EARPHONES_SNAPSHOT_PATH", os.path.splitext(DB_PATH)[0] + ".snapshot.db")
+
+# Seconds between snapshot refreshes, i.e. the most a catalog read lags writes
+SNAPSHOT_INTERVAL = float(os.environ.get("EARPHONES_SNAPSHOT_INTERVAL", "30"))
+
+# Minimum seconds between checks for a replaced snapshot file
+SNAPSHOT_CHECK_INTERVAL = 0.1
+
+# Pragmas for snapshot connections (the file never changes under them)
+READ_PRAGMAS = (
+    "PRAGMA query_only=1",
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class SnapshotManager:
+    """Keeps a read-only copy of the primary fresh and pools connections to it"""
+
+    def __init__(self, primary: str = DB_PATH, path: str = SNAPSHOT_PATH,
+                 interval: float = SNAPSHOT_INTERVAL, pool_size: int = POOL_SIZE):
+        self.primary = primary
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._generation: Optional[Tuple[int, int]] = None
+        self._mtime = 0.0
+        self._last_stat = float("-inf")
+        self._pool: Optional[ConnectionPool] = None
+        self._pool_generation: Optional[Tuple[int, int]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self.refreshes = 0
+        self.refresh_seconds = 0.0
+        self.switches = 0
+
+    def uri(self) -> str:
+        return f"file:{self.path}?mode=ro&immutable=1"
+
+    def generation(self) -> Optional[Tuple[int, int]]:
+        """Identity of the current snapshot file (inode, mtime), re-read at most every 0.1s"""
+        now = time.monotonic()
+        if now - self._last_stat >= SNAPSHOT_CHECK_INTERVAL:
+            self._last_stat = now
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._generation = None
+            else:
+                self._generation = (st.st_ino, st.st_mtime_ns)
+                self._mtime = st.st_mtime
+        return self._generation
+
+    def age(self) -> float:
+        """Seconds since the current snapshot was taken (inf if there is none)"""
+        if self.generation() is None:
+            return float("inf")
+        return max(time.time() - self._mtime, 0.0)
+
+    def refresh(self, force: bool = False, wait: bool = False) -> bool:
+        """Copy the primary into a new snapshot if the current one is due
+
+        Only one process copies at a time; the others skip (or, with
+        ``wait``, block and then use the copy just made). Returns whether
+        this call made a new snapshot.
+        """
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    return False
+            self._last_stat = float("-inf")
+            if not force and self.age() < self.interval:
+                return False
+            start = time.perf_counter()
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            source = sqlite3.connect(self.primary, timeout=5.0)
+            target = sqlite3.connect(tmp)
+            try:
+                source.backup(target)
+                # Rollback-journal mode, so the copy is self-contained
+                target.execute("PRAGMA journal_mode=DELETE")
+                target.close()
+                os.replace(tmp, self.path)
+            except BaseException:
+                target.close()
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            finally:
+                source.close()
+            self._last_stat = float("-inf")
+            elapsed = time.perf_counter() - start
+        self.refreshes += 1
+        self.refresh_seconds += elapsed
+        logger.info(f"Refreshed read snapshot {self.path} in {elapsed:.3f}s")
+        return True
+
+    def pool(self) -> ConnectionPool:
+        """Pool for the current snapshot, replaced when the file is"""
+        generation = self.generation()
+        if generation is None:
+            self.refresh(force=True, wait=True)
+            generation = self.generation()
+        if generation != self._pool_generation:
+            with self._lock:
+                if generation != self._pool_generation:
+                    old = self._pool
+                    self._pool = ConnectionPool(self.uri(), size=self.pool_size, uri=True,
+                                                pragmas=READ_PRAGMAS)
+                    self._pool_generation = generation
+                    if old is not None:
+                        # Idle connections close now, busy ones when released
+                        old.close()
+                        self.switches += 1
+        return self._pool
+
+    def _run(self) -> None:
+        while not self._stop.wait(min(self.interval / 4, 5.0)):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Read snapshot refresh failed: {e}")
+
+    def start(self) -> None:
+        """Refresh the snapshot from a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-snapshot", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._pool is not None:
+            self._pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "age_seconds": round(self.age(), 3),
+            "interval_seconds": self.interval,
+            "refreshes": self.refreshes,
+            "refresh_seconds": round(self.refresh_seconds, 6),
+            "switches": self.switches,
+            "pool": self._pool.stats() if self._pool is not None else None,
+        }
+
+
+_snapshots: Optional[SnapshotManager] = None
+_snapshots_pid: Optional[int] = None
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshots() -> SnapshotManager:
+    """Process-wide snapshot manager, recreated after fork"""
+    global _snapshots, _snapshots_pid
+    pid = os.getpid()
+    if _snapshots is None or _snapshots_pid != pid:
+        with _snapshots_lock:
+            if _snapshots is None or _snapshots_pid != pid:
+                _snapshots = SnapshotManager()
+                _snapshots_pid = pid
+                _snapshots.refresh(wait=True)
+                _snapshots.start()
+    return _snapshots
+
+
+def close_snapshots() -> None:
+    global _snapshots, _snapshots_pid
+    with _snapshots_lock:
+        if _snapshots is not None:
+            _snapshots.close()
+        _snapshots = None
+        _snapshots_pid = None
+
+
+def get_read_pool() -> ConnectionPool:
+    """Pool for catalog reads: the snapshot's with EARPHONES_SNAPSHOT=1, else the primary's"""
+    if not SNAPSHOT_ENABLED:
+        return get_pool()
+    return get_snapshots().pool()
+
+
+def _snapshot_metrics():
+    if _snapshots is None:
+        return []
+    stats = _snapshots.stats()
+    return [
+        ("earphones_snapshot_age_seconds", "gauge", "Seconds since the read snapshot was taken",
+         [({}, stats["age_seconds"])]),
+        ("earphones_snapshot_refreshes_total", "counter", "Snapshots taken by this process",
+         [({}, stats["refreshes"])]),
+        ("earphones_snapshot_refresh_seconds_total", "counter", "Time spent taking snapshots",
+         [({}, stats["refresh_seconds"])]),
+        ("earphones_snapshot_switches_total", "counter", "Moves to a newer snapshot file",
+         [({}, stats["switches"])]),
+    ]
+
+
+metrics.register_collector(_snapshot_metrics)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Warm start for the action server
+Runs before the server starts listening: opens every pooled connection,
+pulls the product tables and all indexes into the page cache, prepares
+the registered read queries on each connection and builds the product
+catalog and fuzzy index, timing each phase. The report is logged, served
+at /ready on the metrics port (503 until warm) and exported as
+earphones_startup_phase_seconds.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from . import IMPORT_STARTED, metrics
+from .catalog import get_catalog
+from .db import get_pool, get_change_watcher
+from .fuzzy import get_fuzzy_index
+from .queries import REGISTRY
+from .snapshot import SNAPSHOT_ENABLED, get_read_pool
+
+logger = logging.getLogger(__name__)
+
+# Set EARPHONES_WARM_START=0 to start listening immediately and warm lazily
+WARM_START = os.environ.get("EARPHONES_WARM_START", "1") != "0"
+
+# Tables read in full during warm-up (every index is read regardless)
+WARM_TABLES = tuple(t.strip() for t in os.environ.get(
+    "EARPHONES_WARM_TABLES",
+    "products,product_tags,tags,products_fts_data,products_fts_idx,products_fts_docsize",
+).split(",") if t.strip())
+
+
+class StartupReport:
+    """Durations of the startup phases, in the order they ran"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self.errors: Dict[str, str] = {}
+        self.ready = False
+        self._mark = IMPORT_STARTED
+
+    def record(self, phase: str) -> None:
+        """Close a phase that ran since the previous mark (e.g. module imports)"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._mark))
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase; a failure is logged and recorded, not raised"""
+        self._mark = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e)
+            logger.warning(f"Warm-up phase {name} failed: {e}")
+        self.record(name)
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.phases)
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases)
+        return f"{self.total:.3f}s ({parts})"
+
+    def as_dict(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "total_seconds": round(self.total, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases},
+            "errors": self.errors,
+        }
+
+
+report = StartupReport()
+
+
+def open_pool() -> int:
+    """Open every pooled connection up front; returns how many are open"""
+    pool = get_pool()
+    conns = [pool.acquire() for _ in range(pool.size)]
+    for conn in conns:
+        pool.release(conn)
+    return len(conns)
+
+
+def warm_pages() -> int:
+    """Read the product tables and every index; returns the rows visited"""
+    visited = 0
+    with get_pool().connection() as conn:
+        known = dict(conn.execute(
+            "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'index')"))
+        for table in WARM_TABLES:
+            if known.get(table) == "table":
+                visited += conn.execute(f"SELECT count(*) FROM {table} NOT INDEXED").fetchone()[0]
+        for name, table in conn.execute(
+                "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'").fetchall():
+            visited += conn.execute(
+                f"SELECT count(*) FROM {table} INDEXED BY {name}").fetchone()[0]
+    return visited
+
+
+def prepare_statements() -> int:
+    """Run every registered read query on every pooled connection
+
+    Leaves the statements in each connection's statement cache, so the
+    first real request doesn't pay for parsing and planning.
+    """
+    pool = get_pool()
+    reads = [q for q in REGISTRY.values()
+             if q.sql.lstrip().upper().startswith("SELECT") and not q.allow_scan]
+    conns = [pool.acquire() for _ in range(max(pool.stats()["open"], 1))]
+    try:
+        for conn in conns:
+            for query in reads:
+                try:
+                    conn.execute(query.sql, query.sample_params).fetchall()
+                except sqlite3.OperationalError:
+                    # e.g. change_log on a database setup_database.py hasn't migrated
+                    continue
+    finally:
+        for conn in conns:
+            pool.release(conn)
+    return len(reads)
+
+
+def warm_start() -> StartupReport:
+    """Run the warm-up phases and mark the process ready"""
+    report.record("imports")
+    with report.phase("pool"):
+        open_pool()
+    with report.phase("page_cache"):
+        warm_pages()
+    with report.phase("statements"):
+        prepare_statements()
+    if SNAPSHOT_ENABLED:
+        with report.phase("snapshot"):
+            get_read_pool()
+    with report.phase("change_watcher"):
+        get_change_watcher().version()
+    catalog = get_catalog()
+    if catalog is not None:
+        with report.phase("catalog"):
+            catalog.refresh()
+    index = get_fuzzy_index()
+    if index is not None:
+        with report.phase("fuzzy_index"):
+            index.refresh()
+    mark_ready()
+    logger.info(f"Action server warm in {report.summary()}")
+    return report
+
+
+def mark_ready() -> None:
+    report.ready = True
+
+
+def _ready_route() -> Tuple[int, str, bytes]:
+    return (200 if report.ready else 503, "application/json",
+            json.dumps(report.as_dict()).encode())
+
+
+def _startup_metrics():
+    return [
+        ("earphones_ready", "gauge", "1 once the startup warm-up has finished",
+         [({}, int(report.ready))]),
+        ("earphones_startup_phase_seconds", "gauge", "Time spent in each startup phase",
+         [({"phase": name}, seconds) for name, seconds in report.phases]),
+    ]
+
+
+metrics.add_route("/ready", _ready_route)
+metrics.register_collector(_startup_metrics)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Message templates for the product and order actions
+Templates are compiled once at import; the per-product display snippets
+are rendered once and kept per process, so a turn only joins cached
+strings. Product rows follow the products table column order:
+(id, name, brand, price, quantity, rating, tags)
+"""
+
+import os
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+from .db import get_change_watcher
+
+# Most product snippets kept per process before the cache is emptied
+SNIPPET_CACHE_SIZE = int(os.environ.get("EARPHONES_SNIPPET_CACHE_SIZE", "20000"))
+
+# Product snippets ---------------------------------------------------------
+
+SEARCH_LINE = "\n- {1} by {2} (Price: ${3:.2f}, Stock: {4}, Rating: {5}/5)".format
+RECOMMENDATION = "**{1}** by {2}\n   💰 ${3:.2f} | ⭐ {5}/5 stars\n   🔖 {6}\n\n".format
+POPULAR_LINE = "🎧 **{1}** - ${3:.2f} (⭐ {5}/5)\n".format
+
+SEARCH_HEADER = "I found these products:\n"
+RECOMMENDATIONS_HEADER = "Based on your preferences, here are my top recommendations:\n\n"
+RECOMMENDATIONS_FOOTER = ("These products match your criteria perfectly! "
+                          "Would you like more details about any of them?")
+NO_RECOMMENDATIONS = ("I couldn't find products matching all your preferences. "
+                      "Let me suggest some popular alternatives or you can adjust your criteria!")
+POPULAR_HEADER = "\n\nHere are some of our most popular earphones:\n\n"
+
+
+class SnippetCache:
+    """Rendered text per (template, product row)
+
+    Keys include the whole row, so an edited product never reuses an old
+    snippet; with ``table`` set, the snippets of written products are also
+    dropped as the ChangeWatcher reports them (everything when it can't
+    tell which), so superseded rows don't pile up.
+    """
+
+    def __init__(self, max_size: int = SNIPPET_CACHE_SIZE, table: Optional[str] = None):
+        self.max_size = max_size
+        self.table = table
+        self._snippets: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, template: Callable[..., str], rows: Iterable[Tuple]) -> list:
+        """Snippet for each row, rendering only the ones not seen before"""
+        if self.table is not None:
+            watcher = get_change_watcher()
+            version = watcher.version(self.table)
+            if version != self._version:
+                changed = watcher.changes_since(self.table, self._version)
+                with self._lock:
+                    if changed is None:
+                        self._snippets.clear()
+                    else:
+                        for key in [k for k in self._snippets if k[1][0] in changed]:
+                            del self._snippets[key]
+                    self._version = version
+        snippets = self._snippets
+        out = []
+        for row in rows:
+            key = (template, row)
+            text = snippets.get(key)
+            if text is None:
+                text = template(*row)
+                # Lookups skip the lock; every change to the dict takes it, so
+                # the stale-key sweep never sees it change size under it
+                with self._lock:
+                    if len(snippets) >= self.max_size:
+                        snippets.clear()
+                    snippets[key] = text
+                self.misses += 1
+            else:
+                self.hits += 1
+            out.append(text)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snippets.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._snippets), "hits": self.hits, "misses": self.misses}
+
+
+_snippets = SnippetCache(table="products")
+
+
+def get_snippet_cache() -> SnippetCache:
+    """Process-wide product snippet cache"""
+    return _snippets
+
+
+def render_search_results(rows: Sequence[Tuple]) -> str:
+    return SEARCH_HEADER + "".join(_snippets.render(SEARCH_LINE, rows))
+
+
+def render_recommendations(rows: Sequence[Tuple]) -> str:
+    snippets = _snippets.render(RECOMMENDATION, rows)
+    numbered = [f"{i}. {text}" for i, text in enumerate(snippets, 1)]
+    return RECOMMENDATIONS_HEADER + "".join(numbered) + RECOMMENDATIONS_FOOTER
+
+
+def render_no_recommendations(popular: Sequence[Tuple]) -> str:
+    """Fallback message, listing popular products when there are any"""
+    if not popular:
+        return NO_RECOMMENDATIONS
+    return NO_RECOMMENDATIONS + POPULAR_HEADER + "".join(_snippets.render(POPULAR_LINE, popular))
+
+
+# Order status -------------------------------------------------------------
+
+STATUS_EMOJI = {
+    "processing": "⏳",
+    "shipped": "🚚",
+    "delivered": "✅",
+    "cancelled": "❌",
+}
+DEFAULT_STATUS_EMOJI = "📦"
+
+STATUS_NOTES = {
+    "processing": "Your order is being prepared and will ship soon!",
+    "shipped": "Your order is on its way! You should receive it in 2-3 business days.",
+    "delivered": "Your order has been delivered! We hope you enjoy your new earphones!",
+    "cancelled": "Your order has been cancelled. If you have questions, please contact our support team.",
+}
+
+ORDER_NOT_FOUND = (
+    "I couldn't find an order with ID {order_id} associated with email {email}. "
+    "Please check your order ID and email address, or contact our support team for assistance."
+).format
+
+
+def render_order_status(order_id, order: Tuple) -> str:
+    """Status message for an order row (see queries.ORDER_COLUMNS)"""
+    status = order[4]
+    key = status.lower()
+    # One f-string: compiled to a single BUILD_STRING, no per-call dicts
+    return (
+        f"📋 **Order Status Update**\n\n"
+        f"🆔 Order ID: {order_id}\n"
+        f"{STATUS_EMOJI.get(key, DEFAULT_STATUS_EMOJI)} Status: **{status.upper()}**\n"
+        f"💰 Amount: ${order[3]:.2f}\n"
+        f"📅 Order Date: {order[5]}\n"
+        f"🏠 Shipping Address: {order[2]}\n\n"
+        f"{STATUS_NOTES.get(key, '')}"
+    )
+
+
+def render_order_not_found(order_id, email: str) -> str:
+    return ORDER_NOT_FOUND(order_id=order_id, email=email)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Group-commit write queue for complaint inserts
+Callers enqueue a complaint and get a future for its id; one writer thread
+drains the queue and commits whatever has arrived within a few ms (or up
+to a batch size) in a single transaction, so a burst costs one write lock
+and one commit per batch instead of per complaint
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from . import metrics
+from .db import execute, get_pool
+from .queries import INSERT_COMPLAINT
+
+logger = logging.getLogger(__name__)
+
+# Most complaints committed in one transaction
+WRITE_BATCH = int(os.environ.get("EARPHONES_WRITE_BATCH", "64"))
+
+# How long the writer waits for more complaints during a burst
+WRITE_FLUSH_MS = float(os.environ.get("EARPHONES_WRITE_FLUSH_MS", "5"))
+
+# Queued complaints before new ones are refused, and how long to wait for room
+WRITE_QUEUE_SIZE = int(os.environ.get("EARPHONES_WRITE_QUEUE_SIZE", "1000"))
+WRITE_QUEUE_TIMEOUT = float(os.environ.get("EARPHONES_WRITE_QUEUE_TIMEOUT", "1.0"))
+
+# First and longest pause (seconds) of a coroutine polling a full queue
+QUEUE_RETRY_MIN = 0.001
+QUEUE_RETRY_MAX = 0.05
+
+
+class WriteQueueFull(sqlite3.OperationalError):
+    """Raised when the write queue stays full for the enqueue timeout"""
+
+
+class _Complaint(NamedTuple):
+    params: tuple
+    future: Future
+
+
+class ComplaintWriter:
+    """Bounded queue of complaint inserts drained by one writer thread"""
+
+    def __init__(self, batch_size: int = WRITE_BATCH, flush_ms: float = WRITE_FLUSH_MS,
+                 max_queue: int = WRITE_QUEUE_SIZE, timeout: float = WRITE_QUEUE_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.timeout = timeout
+        self._queue: "queue.Queue[Optional[_Complaint]]" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        # Metrics
+        self.submitted = 0
+        self.rejected = 0
+        self.commits = 0
+        self.committed = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="complaint-writer", daemon=True)
+        self._thread.start()
+
+    def _complaint(self, order_id: int, user_id: int, topic: str, description: str) -> _Complaint:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Complaint writer is closed")
+        return _Complaint((order_id, user_id, topic, description, datetime.now()), Future())
+
+    def _full(self) -> WriteQueueFull:
+        self.rejected += 1
+        return WriteQueueFull(
+            f"Complaint queue still full after {self.timeout}s "
+            f"({self._queue.maxsize} waiting)"
+        )
+
+    def submit(self, order_id: int, user_id: int, topic: str, description: str) -> "Future[int]":
+        """Queue a complaint; the future resolves to its id once committed
+
+        Blocks for up to the queue timeout while the queue is full, so
+        coroutines must use submit_async() instead.
+        """
+        item = self._complaint(order_id, user_id, topic, description)
+        try:
+            self._queue.put(item, timeout=self.timeout)
+        except queue.Full:
+            raise self._full()
+        self.submitted += 1
+        return item.future
+
+    async def submit_async(self, order_id: int, user_id: int, topic: str, description: str) -> int:
+        """submit() for coroutines: waits for room and for the commit without blocking the loop"""
+        item = self._complaint(order_id, user_id, topic, description)
+        deadline = time.monotonic() + self.timeout
+        delay = QUEUE_RETRY_MIN
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                break
+            except queue.Full:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._full()
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, QUEUE_RETRY_MAX)
+        self.submitted += 1
+        return await asyncio.wrap_future(item.future)
+
+    def _next_batch(self) -> Optional[List[_Complaint]]:
+        """Block for one complaint, then take whatever arrives until the deadline
+
+        A lone complaint is committed at once; the writer only lingers for
+        the flush deadline when others are already queued behind it.
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        if self._queue.empty():
+            return batch
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 \
+                    else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._commit(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._fail(batch, e)
+                    continue
+                # Retry one by one so a single bad row only fails its own caller
+                for item in batch:
+                    try:
+                        self._commit([item])
+                    except Exception as e:
+                        self._fail([item], e)
+
+    def _commit(self, batch: List[_Complaint]) -> None:
+        with get_pool().connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            ids = [execute(conn, INSERT_COMPLAINT, item.params).lastrowid for item in batch]
+            conn.commit()
+        self.commits += 1
+        self.committed += len(batch)
+        metrics.WRITE_BATCH_SIZE.observe(len(batch))
+        for item, complaint_id in zip(batch, ids):
+            if not item.future.cancelled():
+                item.future.set_result(complaint_id)
+
+    def _fail(self, batch: List[_Complaint], error: Exception) -> None:
+        self.failed += len(batch)
+        logger.error(f"Complaint insert failed: {error}")
+        for item in batch:
+            if not item.future.cancelled():
+                item.future.set_exception(error)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Commit what is queued, then stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and group commit counters"""
+        return {
+            "depth": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "commits": self.commits,
+            "committed": self.committed,
+            "mean_batch_size": round(self.committed / self.commits, 2) if self.commits else 0.0,
+        }
+
+
+_writer: Optional[ComplaintWriter] = None
+_writer_pid: Optional[int] = None
+_writer_lock = threading.Lock()
+
+
+def get_complaint_writer() -> ComplaintWriter:
+    """Process-wide complaint writer, recreated after fork"""
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is None or _writer_pid != pid:
+        with _writer_lock:
+            if _writer is None or _writer_pid != pid:
+                _writer = ComplaintWriter()
+                _writer_pid = pid
+    return _writer
+
+
+def close_complaint_writer() -> None:
+    """Flush and stop the process-wide complaint writer"""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            _writer.close()
+        _writer = None
+        _writer_pid = None
+
+
+# Don't drop queued complaints when the action server exits
+atexit.register(close_complaint_writer)
+
+
+def _writer_metrics():
+    if _writer is None:
+        return []
+    stats = _writer.stats()
+    return [
+        ("earphones_write_queue_depth", "gauge", "Complaints waiting for a group commit",
+         [({}, stats["depth"])]),
+        ("earphones_write_queue_rejected_total", "counter",
+         "Complaints refused because the queue was full", [({}, stats["rejected"])]),
+        ("earphones_write_queue_failed_total", "counter", "Complaints whose insert failed",
+         [({}, stats["failed"])]),
+    ]
+
+
+metrics.register_collector(_writer_metrics)
@@ -0,0 +1 @@
+# Custom Rasa NLU components for Earphones Store Chatbot
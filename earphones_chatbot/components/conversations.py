@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Persistent conversation storage for the Rasa server
+Conversation events are kept in a local SQLite file as zlib-compressed
+JSON, one row per conversation, with a bounded in-memory LRU of recently
+used conversations in front of it. Saves cut the history down to a window
+of recent events (on conversation session boundaries where possible) and
+periodically delete conversations idle for too long. Has no Rasa
+dependency; components.tracker_store adapts it to Rasa's TrackerStore and
+LockStore interfaces.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from actions import metrics
+from actions.db import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Conversation database (relative to the directory the Rasa server is started from)
+TRACKER_DB_PATH = os.environ.get("EARPHONES_TRACKER_DB", "../data/conversations.db")
+
+# Conversations kept decoded in memory per process
+TRACKER_CACHE_SIZE = int(os.environ.get("EARPHONES_TRACKER_CACHE_SIZE", "1000"))
+
+# Events stored per conversation; older sessions are dropped
+TRACKER_MAX_EVENTS = int(os.environ.get("EARPHONES_TRACKER_MAX_EVENTS", "500"))
+
+# Conversations without a new event for this many hours are deleted (0 = keep)
+TRACKER_IDLE_HOURS = float(os.environ.get("EARPHONES_TRACKER_IDLE_HOURS", "168"))
+
+# Minimum seconds between idle-conversation sweeps
+TRACKER_SWEEP_INTERVAL = float(os.environ.get("EARPHONES_TRACKER_SWEEP_INTERVAL", "300"))
+
+# zlib level for stored events (1 = fastest, 9 = smallest)
+TRACKER_COMPRESSION = int(os.environ.get("EARPHONES_TRACKER_COMPRESSION", "6"))
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS conversations (
+        sender_id TEXT PRIMARY KEY,
+        revision INTEGER NOT NULL,
+        updated_at REAL NOT NULL,
+        n_events INTEGER NOT NULL,
+        events BLOB NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations(updated_at)",
+    """CREATE TABLE IF NOT EXISTS conversation_locks (
+        conversation_id TEXT PRIMARY KEY,
+        lock TEXT NOT NULL
+    ) WITHOUT ROWID""",
+)
+
+# The events blob is only read when the cached revision is out of date
+SELECT_CONVERSATION = ("SELECT revision, CASE WHEN revision = ? THEN NULL ELSE events END "
+                       "FROM conversations WHERE sender_id = ?")
+UPSERT_CONVERSATION = """
+    INSERT INTO conversations (sender_id, revision, updated_at, n_events, events)
+    VALUES (?, 1, ?, ?, ?)
+    ON CONFLICT(sender_id) DO UPDATE SET
+        revision = revision + 1, updated_at = excluded.updated_at,
+        n_events = excluded.n_events, events = excluded.events
+    RETURNING revision
+"""
+DELETE_CONVERSATION = "DELETE FROM conversations WHERE sender_id = ?"
+DELETE_IDLE = "DELETE FROM conversations WHERE updated_at < ? RETURNING sender_id"
+SELECT_SENDER_IDS = "SELECT sender_id FROM conversations"
+SELECT_LOCK = "SELECT lock FROM conversation_locks WHERE conversation_id = ?"
+UPSERT_LOCK = "INSERT OR REPLACE INTO conversation_locks (conversation_id, lock) VALUES (?, ?)"
+DELETE_LOCK = "DELETE FROM conversation_locks WHERE conversation_id = ?"
+
+# Event that opens a conversation session (followed by session_started)
+SESSION_START = "action_session_start"
+
+
+def encode_events(events: List[Dict[str, Any]], level: int = TRACKER_COMPRESSION) -> bytes:
+    return zlib.compress(json.dumps(events, separators=(",", ":")).encode(), level)
+
+
+def decode_events(blob: bytes) -> List[Dict[str, Any]]:
+    return json.loads(zlib.decompress(blob))
+
+
+def prune_events(events: List[Dict[str, Any]], max_events: int,
+                 slots: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """The most recent events of a conversation, at most ``max_events``
+
+    Cuts at the first session start inside the window, so the kept history
+    replays to the same state (carried-over slots are re-set at every
+    session start). A session longer than the window is cut mid-session and
+    the current ``slots`` values are re-set in front of the kept events.
+    """
+    if max_events <= 0 or len(events) <= max_events:
+        return events
+    first = len(events) - max_events
+    for i in range(first, len(events)):
+        if events[i].get("event") == "action" and events[i].get("name") == SESSION_START:
+            return events[i:]
+    kept = events[first:]
+    if not slots:
+        return kept
+    timestamp = kept[0].get("timestamp")
+    restored = [{"event": "slot", "name": name, "value": value, "timestamp": timestamp}
+                for name, value in slots.items() if value is not None]
+    return restored + kept[len(restored):]
+
+
+class ConversationStore:
+    """Conversation events in SQLite behind an LRU of decoded conversations
+
+    Every stored conversation carries a revision bumped on each save. A
+    cached conversation is only used while its revision still matches the
+    database, so several Rasa processes can share one file.
+    """
+
+    def __init__(self, db_path: str = TRACKER_DB_PATH, cache_size: int = TRACKER_CACHE_SIZE,
+                 max_events: int = TRACKER_MAX_EVENTS, idle_hours: float = TRACKER_IDLE_HOURS,
+                 sweep_interval: float = TRACKER_SWEEP_INTERVAL, pool_size: int = 4):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.max_events = max_events
+        self.idle_seconds = idle_hours * 3600
+        self.sweep_interval = sweep_interval
+        self._pool = ConnectionPool(db_path, size=pool_size)
+        # sender_id -> (revision, events)
+        self._cache: "OrderedDict[str, Tuple[int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+        with self._pool.connection() as conn:
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.saves = 0
+        self.pruned = 0
+        self.evicted = 0
+        self.bytes_written = 0
+
+    # Cache ------------------------------------------------------------------
+
+    def _cached(self, sender_id: str) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        with self._lock:
+            entry = self._cache.get(sender_id)
+            if entry is None:
+                return 0, None
+            self._cache.move_to_end(sender_id)
+            return entry
+
+    def _remember(self, sender_id: str, revision: int, events: List[Dict[str, Any]]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[sender_id] = (revision, events)
+            self._cache.move_to_end(sender_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, sender_ids: List[str]) -> None:
+        with self._lock:
+            for sender_id in sender_ids:
+                self._cache.pop(sender_id, None)
+
+    # Conversations ------------------------------------------------------------
+
+    def load(self, sender_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Stored events of a conversation, or None if it isn't stored"""
+        revision, events = self._cached(sender_id)
+        with self._pool.connection() as conn:
+            row = conn.execute(SELECT_CONVERSATION, (revision, sender_id)).fetchone()
+        if row is None:
+            if events is not None:
+                self._forget([sender_id])
+            return None
+        if row[1] is None:
+            self.hits += 1
+            return events
+        self.misses += 1
+        events = decode_events(row[1])
+        self._remember(sender_id, row[0], events)
+        return events
+
+    def save(self, sender_id: str, events: List[Dict[str, Any]],
+             slots: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Store a conversation's events (pruned to the window); returns what was stored"""
+        kept = prune_events(events, self.max_events, slots)
+        blob = encode_events(kept)
+        with self._pool.connection() as conn:
+            with conn:
+                revision = conn.execute(
+                    UPSERT_CONVERSATION, (sender_id, time.time(), len(kept), blob)).fetchall()[0][0]
+        self._remember(sender_id, revision, kept)
+        self.saves += 1
+        self.pruned += len(events) - len(kept)
+        self.bytes_written += len(blob)
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.evict_idle()
+        return kept
+
+    def delete(self, sender_id: str) -> None:
+        with self._pool.connection() as conn:
+            with conn:
+                conn.execute(DELETE_CONVERSATION, (sender_id,))
+        self._forget([sender_id])
+
+    def sender_ids(self) -> List[str]:
+        with self._pool.connection() as conn:
+            return [row[0] for row in conn.execute(SELECT_SENDER_IDS)]
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Delete conversations idle longer than the idle window; returns how many"""
+        self._last_sweep = time.monotonic()
+        if self.idle_seconds <= 0:
+            return 0
+        cutoff = (now if now is not None else time.time()) - self.idle_seconds
+        with self._pool.connection() as conn:
+            with conn:
+                gone = [row[0] for row in conn.execute(DELETE_IDLE, (cutoff,))]
+        self._forget(gone)
+        self.evicted += len(gone)
+        if gone:
+            logger.info(f"Deleted {len(gone)} idle conversations from {self.db_path}")
+        return len(gone)
+
+    # Locks ------------------------------------------------------------------
+
+    def get_lock(self, conversation_id: str) -> Optional[str]:
+        """Serialized lock of a conversation, or None"""
+        with self._pool.connection() as conn:
+            row = conn.execute(SELECT_LOCK, (conversation_id,)).fetchone()
+        return row[0] if row else None
+
+    def update_lock(self, conversation_id: str,
+                    update: Callable[[Optional[str]], Tuple[Optional[str], Any]]) -> Any:
+        """Read-modify-write a conversation's lock under the database write lock
+
+        ``update`` gets the serialized lock (or None) and returns the new
+        serialized lock (None deletes it) and a result passed back to the
+        caller, so concurrent processes can't hand out the same ticket.
+        """
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(SELECT_LOCK, (conversation_id,)).fetchone()
+                new, result = update(row[0] if row else None)
+                if new is None:
+                    conn.execute(DELETE_LOCK, (conversation_id,))
+                else:
+                    conn.execute(UPSERT_LOCK, (conversation_id, new))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return result
+
+    def set_lock(self, conversation_id: str, lock: Optional[str]) -> None:
+        with self._pool.connection() as conn:
+            with conn:
+                if lock is None:
+                    conn.execute(DELETE_LOCK, (conversation_id,))
+                else:
+                    conn.execute(UPSERT_LOCK, (conversation_id, lock))
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saves": self.saves,
+            "pruned_events": self.pruned,
+            "evicted": self.evicted,
+            "bytes_written": self.bytes_written,
+        }
+
+
+_stores: List[ConversationStore] = []
+
+
+def register(store: ConversationStore) -> ConversationStore:
+    """Include a store in the earphones_tracker_store_* metrics"""
+    _stores.append(store)
+    return store
+
+
+def _store_metrics():
+    if not _stores:
+        return []
+    stats = [store.stats() for store in _stores]
+    return [
+        ("earphones_tracker_store_cached", "gauge", "Conversations held in the in-memory LRU",
+         [({}, sum(s["cached"] for s in stats))]),
+        ("earphones_tracker_store_loads_total", "counter", "Conversation loads by cache result",
+         [({"result": "hit"}, sum(s["hits"] for s in stats)),
+          ({"result": "miss"}, sum(s["misses"] for s in stats))]),
+        ("earphones_tracker_store_saves_total", "counter", "Conversation saves",
+         [({}, sum(s["saves"] for s in stats))]),
+        ("earphones_tracker_store_pruned_events_total", "counter",
+         "Events dropped by the history window",
+         [({}, sum(s["pruned_events"] for s in stats))]),
+        ("earphones_tracker_store_evicted_total", "counter", "Idle conversations deleted",
+         [({}, sum(s["evicted"] for s in stats))]),
+        ("earphones_tracker_store_written_bytes_total", "counter", "Compressed event bytes saved",
+         [({}, sum(s["bytes_written"] for s in stats))]),
+    ]
+
+
+metrics.register_collector(_store_metrics)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Matcher for structured user messages that don't need the NLU model
+Recognizes whole messages that are an order ID, an email address or a
+plain greeting, using regexes compiled once and a normalized-text lookup
+table. Has no Rasa dependency so the action server, tests and benchmarks
+can use it directly.
+
+Brand names are deliberately not matched: a bare "Sony" is an answer to
+whatever the bot just asked (a search term, a preference), and only the
+model sees enough context to tell which.
+"""
+
+import re
+from typing import List, NamedTuple, Optional, Sequence
+
+# Phrases answered as greet (compared after normalize())
+DEFAULT_GREETINGS = (
+    "hi", "hello", "hey", "hi there", "hello there", "hey there", "howdy",
+    "good morning", "good afternoon", "good evening", "goodmorning", "goodevening",
+)
+
+ORDER_ID_RE = re.compile(
+    r"(?:(?:my\s+)?order(?:\s+(?:id|number|no))?(?:\s+is)?\s*[:#]?\s*)?#?(\d{5,7})",
+    re.IGNORECASE)
+EMAIL_RE = re.compile(
+    r"(?:(?:my\s+)?e-?mail(?:\s+address)?(?:\s+is)?\s*:?\s*)?"
+    r"([A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,})",
+    re.IGNORECASE)
+
+_TRAILING_RE = re.compile(r"[\s.!?,]+$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class Entity(NamedTuple):
+    entity: str
+    value: str
+    start: int
+    end: int
+
+
+class StructuredMatch(NamedTuple):
+    rule: str               # order_id, email or greeting
+    intent: str
+    entities: List[Entity]
+
+
+def normalize(text: str) -> str:
+    """Lowercase, single-spaced, without trailing punctuation"""
+    return _SPACE_RE.sub(" ", _TRAILING_RE.sub("", text.strip())).lower()
+
+
+class StructuredMatcher:
+    """Exact matcher for messages whose intent needs no model
+
+    Only whole-message matches count, so "order 12345 is late" or
+    "is Sony any good" still go to the classifier.
+    """
+
+    def __init__(self, greetings: Sequence[str] = DEFAULT_GREETINGS,
+                 order_intent: str = "provide_order_id", email_intent: str = "provide_email",
+                 greeting_intent: str = "greet"):
+        self.order_intent = order_intent
+        self.email_intent = email_intent
+        self.greeting_intent = greeting_intent
+        self._greetings = {normalize(g) for g in greetings}
+
+    def match(self, text: str) -> Optional[StructuredMatch]:
+        stripped = _TRAILING_RE.sub("", text.strip())
+        if not stripped:
+            return None
+        offset = len(text) - len(text.lstrip())
+
+        # Cheap dispatch on the shape of the message before any regex runs
+        if any(c.isdigit() for c in stripped):
+            m = ORDER_ID_RE.fullmatch(stripped)
+            if m:
+                return StructuredMatch("order_id", self.order_intent, [
+                    Entity("order_id", m.group(1), offset + m.start(1), offset + m.end(1))])
+        if "@" in stripped:
+            m = EMAIL_RE.fullmatch(stripped)
+            if m:
+                return StructuredMatch("email", self.email_intent, [
+                    Entity("email", m.group(1), offset + m.start(1), offset + m.end(1))])
+            return None
+
+        if normalize(stripped) in self._greetings:
+            return StructuredMatch("greeting", self.greeting_intent, [])
+        return None
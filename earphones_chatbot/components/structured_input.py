@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Rasa NLU components that route structured messages around the models
+StructuredInputClassifier sets the intent and entities of messages the
+StructuredMatcher recognizes and flags them; the DIET classifier and
+response selector subclasses below skip flagged messages, so order IDs,
+emails and greetings never reach the transformers.
+
+Pipeline (config.yml):
+    - name: WhitespaceTokenizer
+    - name: components.structured_input.StructuredInputClassifier
+    ...
+    - name: components.structured_input.StructuredAwareDIETClassifier
+    ...
+    - name: components.structured_input.StructuredAwareResponseSelector
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional, Text
+
+from rasa.engine.graph import ExecutionContext, GraphComponent
+from rasa.engine.recipes.default_recipe import DefaultV1Recipe
+from rasa.engine.storage.resource import Resource
+from rasa.engine.storage.storage import ModelStorage
+from rasa.nlu.classifiers.diet_classifier import DIETClassifier
+from rasa.nlu.selectors.response_selector import ResponseSelector
+from rasa.shared.nlu.constants import (
+    ENTITIES, ENTITY_ATTRIBUTE_CONFIDENCE, ENTITY_ATTRIBUTE_END, ENTITY_ATTRIBUTE_START,
+    ENTITY_ATTRIBUTE_TYPE, ENTITY_ATTRIBUTE_VALUE, EXTRACTOR, INTENT, INTENT_NAME_KEY,
+    INTENT_RANKING_KEY, PREDICTED_CONFIDENCE_KEY, TEXT,
+)
+from rasa.shared.nlu.training_data.message import Message
+
+from actions import metrics
+from components.matcher import DEFAULT_GREETINGS, StructuredMatcher
+
+# Message attribute set on bypassed messages (not part of the parse output)
+STRUCTURED_MATCH = "structured_match"
+
+# Port of the Rasa server's metrics endpoint (the action server uses its own)
+NLU_METRICS_PORT = int(os.environ.get("EARPHONES_NLU_METRICS_PORT", "9103"))
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER,
+     DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR],
+    is_trainable=False,
+)
+class StructuredInputClassifier(GraphComponent):
+    """Classifies whole-message order IDs, emails and greetings"""
+
+    @staticmethod
+    def get_default_config() -> Dict[Text, Any]:
+        return {
+            "greetings": list(DEFAULT_GREETINGS),
+            "order_intent": "provide_order_id",
+            "email_intent": "provide_email",
+            "greeting_intent": "greet",
+        }
+
+    def __init__(self, config: Dict[Text, Any]) -> None:
+        self.matcher = StructuredMatcher(
+            config["greetings"],
+            order_intent=config["order_intent"], email_intent=config["email_intent"],
+            greeting_intent=config["greeting_intent"],
+        )
+        metrics.start_http_server(NLU_METRICS_PORT)
+
+    @classmethod
+    def create(cls, config: Dict[Text, Any], model_storage: ModelStorage,
+               resource: Resource, execution_context: ExecutionContext) -> "StructuredInputClassifier":
+        return cls(config)
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        for message in messages:
+            text = message.get(TEXT)
+            match = self.matcher.match(text) if text else None
+            if match is None:
+                metrics.NLU_MESSAGES.inc("model", "none")
+                continue
+            metrics.NLU_MESSAGES.inc("bypass", match.rule)
+
+            intent = {INTENT_NAME_KEY: match.intent, PREDICTED_CONFIDENCE_KEY: 1.0}
+            message.set(INTENT, intent, add_to_output=True)
+            message.set(INTENT_RANKING_KEY, [intent], add_to_output=True)
+            entities = message.get(ENTITIES, []) + [
+                {
+                    ENTITY_ATTRIBUTE_TYPE: e.entity,
+                    ENTITY_ATTRIBUTE_VALUE: e.value,
+                    ENTITY_ATTRIBUTE_START: e.start,
+                    ENTITY_ATTRIBUTE_END: e.end,
+                    ENTITY_ATTRIBUTE_CONFIDENCE: 1.0,
+                    EXTRACTOR: self.__class__.__name__,
+                }
+                for e in match.entities
+            ]
+            message.set(ENTITIES, entities, add_to_output=True)
+            message.set(STRUCTURED_MATCH, match.rule)
+        return messages
+
+
+class _SkipsStructuredInput:
+    """Mixin for model components: process only messages that weren't bypassed
+
+    Keeps a running mean of the model's per-message time, credited to
+    earphones_nlu_saved_seconds_total for every message it skips.
+    """
+
+    _mean_seconds: Optional[float] = None
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        component = self.__class__.__name__
+        todo = [m for m in messages if not m.get(STRUCTURED_MATCH)]
+        skipped = len(messages) - len(todo)
+        if todo:
+            start = time.perf_counter()
+            super().process(todo)
+            per_message = (time.perf_counter() - start) / len(todo)
+            metrics.NLU_MODEL_LATENCY.observe(per_message, component)
+            self._mean_seconds = per_message if self._mean_seconds is None \
+                else 0.9 * self._mean_seconds + 0.1 * per_message
+        if skipped and self._mean_seconds is not None:
+            metrics.NLU_SAVED.inc(component, amount=skipped * self._mean_seconds)
+        return messages
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER,
+     DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR],
+    is_trainable=True,
+)
+class StructuredAwareDIETClassifier(_SkipsStructuredInput, DIETClassifier):
+    """DIETClassifier that leaves StructuredInputClassifier's matches alone"""
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER],
+    is_trainable=True,
+)
+class StructuredAwareResponseSelector(_SkipsStructuredInput, ResponseSelector):
+    """ResponseSelector that skips StructuredInputClassifier's matches"""
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Rasa tracker store and lock store on the local conversation database
+(components.conversations). Without them Rasa keeps every tracker in
+memory for the life of the server and loses them all on restart.
+
+endpoints.yml:
+    tracker_store:
+      type: components.tracker_store.SQLiteTrackerStore
+      db: ../data/conversations.db        # optional, as are the settings below
+      cache_size: 1000
+      max_events: 500
+      idle_hours: 168
+    lock_store:
+      type: components.tracker_store.SQLiteLockStore
+"""
+
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional, Text
+
+from rasa.core.brokers.broker import EventBroker
+from rasa.core.lock import TicketLock
+from rasa.core.lock_store import LockStore
+from rasa.core.tracker_store import TrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.trackers import DialogueStateTracker
+from rasa.utils.endpoints import EndpointConfig
+
+from actions.db import run_db
+from components.conversations import (
+    TRACKER_CACHE_SIZE, TRACKER_DB_PATH, TRACKER_IDLE_HOURS, TRACKER_MAX_EVENTS,
+    ConversationStore, register,
+)
+
+logger = logging.getLogger(__name__)
+
+_stores: Dict[str, ConversationStore] = {}
+
+
+def get_conversation_store(db_path: str, **settings: Any) -> ConversationStore:
+    """One ConversationStore per database file, shared by the tracker and lock stores"""
+    store = _stores.get(db_path)
+    if store is None:
+        store = _stores[db_path] = register(ConversationStore(db_path, **settings))
+        logger.info(f"Storing conversations in {db_path}")
+    return store
+
+
+class SQLiteTrackerStore(TrackerStore):
+    """Trackers stored as compressed events in SQLite with a hot in-memory LRU"""
+
+    def __init__(self, domain: Optional[Domain] = None,
+                 event_broker: Optional[EventBroker] = None,
+                 db: Optional[Text] = None, cache_size: int = TRACKER_CACHE_SIZE,
+                 max_events: int = TRACKER_MAX_EVENTS, idle_hours: float = TRACKER_IDLE_HOURS,
+                 **kwargs: Any) -> None:
+        # Rasa passes the endpoint url as host; this store has no server
+        kwargs.pop("host", None)
+        super().__init__(domain, event_broker, **kwargs)
+        self.store = get_conversation_store(
+            db or TRACKER_DB_PATH, cache_size=int(cache_size),
+            max_events=int(max_events), idle_hours=float(idle_hours))
+
+    def _tracker(self, sender_id: Text, events) -> DialogueStateTracker:
+        return DialogueStateTracker.from_dict(sender_id, events, self.domain.slots)
+
+    async def save(self, tracker: DialogueStateTracker) -> None:
+        await self.stream_events(tracker)
+        events = [event.as_dict() for event in tracker.events]
+        await run_db(self.store.save, tracker.sender_id, events, tracker.current_slot_values())
+
+    async def retrieve(self, sender_id: Text) -> Optional[DialogueStateTracker]:
+        events = await run_db(self.store.load, sender_id)
+        if events is None:
+            return None
+        return self._tracker(sender_id, events)
+
+    async def retrieve_full_tracker(self, conversation_id: Text) -> Optional[DialogueStateTracker]:
+        return await self.retrieve(conversation_id)
+
+    async def keys(self) -> Iterable[Text]:
+        return await run_db(self.store.sender_ids)
+
+    async def delete(self, sender_id: Text) -> None:
+        await run_db(self.store.delete, sender_id)
+
+
+class SQLiteLockStore(LockStore):
+    """Conversation locks in the conversation database
+
+    Ticket issue and cleanup are read-modify-write transactions, so Rasa
+    processes sharing the file never hand out the same ticket twice.
+    """
+
+    def __init__(self, endpoint_config: Optional[EndpointConfig] = None,
+                 db: Optional[Text] = None) -> None:
+        kwargs = endpoint_config.kwargs if endpoint_config else {}
+        self.store = get_conversation_store(db or kwargs.get("db") or TRACKER_DB_PATH)
+        super().__init__()
+
+    def get_lock(self, conversation_id: Text) -> Optional[TicketLock]:
+        serialized = self.store.get_lock(conversation_id)
+        return TicketLock.from_dict(json.loads(serialized)) if serialized else None
+
+    def delete_lock(self, conversation_id: Text) -> None:
+        self.store.set_lock(conversation_id, None)
+
+    def save_lock(self, lock: TicketLock) -> None:
+        self.store.set_lock(lock.conversation_id, lock.dumps())
+
+    def issue_ticket(self, conversation_id: Text, lock_lifetime: float = 60) -> int:
+        def update(serialized):
+            lock = TicketLock.from_dict(json.loads(serialized)) if serialized \
+                else TicketLock(conversation_id)
+            ticket = lock.issue_ticket(lock_lifetime)
+            return lock.dumps(), ticket
+
+        return self.store.update_lock(conversation_id, update)
+
+    def cleanup(self, conversation_id: Text, ticket_number: int) -> None:
+        def update(serialized):
+            if not serialized:
+                return None, None
+            lock = TicketLock.from_dict(json.loads(serialized))
+            lock.remove_ticket_for(ticket_number)
+            return (lock.dumps() if lock.is_someone_waiting() else None), None
+
+        self.store.update_lock(conversation_id, update)
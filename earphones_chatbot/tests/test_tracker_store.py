@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Round trips through the SQLite tracker and lock stores as Rasa loads them
+Needs Rasa 3.6 installed; run from earphones_chatbot/:
+    python -m pytest tests/test_tracker_store.py
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("rasa.core.tracker_store")
+
+from rasa.core.lock_store import LockStore  # noqa: E402
+from rasa.core.tracker_store import TrackerStore  # noqa: E402
+from rasa.shared.core.domain import Domain  # noqa: E402
+from rasa.shared.core.events import (  # noqa: E402
+    ActionExecuted, BotUttered, SessionStarted, SlotSet, UserUttered,
+)
+from rasa.shared.core.trackers import DialogueStateTracker  # noqa: E402
+from rasa.utils.endpoints import EndpointConfig  # noqa: E402
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from components.conversations import ConversationStore  # noqa: E402
+from components.tracker_store import SQLiteLockStore, SQLiteTrackerStore  # noqa: E402
+
+
+@pytest.fixture
+def domain():
+    return Domain.load(os.path.join(BOT_DIR, "domain.yml"))
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "conversations.db")
+
+
+def conversation(sender_id, domain):
+    tracker = DialogueStateTracker(sender_id, domain.slots)
+    for event in (
+        ActionExecuted("action_session_start"),
+        SessionStarted(),
+        ActionExecuted("action_listen"),
+        UserUttered("where is order 111111", {"name": "track_order", "confidence": 0.98},
+                    [{"entity": "order_id", "value": "111111", "start": 15, "end": 21}]),
+        SlotSet("order_id", "111111"),
+        ActionExecuted("utter_ask_user_email"),
+        BotUttered("What is your email?"),
+        ActionExecuted("action_listen"),
+    ):
+        tracker.update(event)
+    return tracker
+
+
+def test_endpoint_config_loads_the_sqlite_stores(domain, db):
+    tracker_store = TrackerStore.create(
+        EndpointConfig(type="components.tracker_store.SQLiteTrackerStore", db=db), domain)
+    lock_store = LockStore.create(
+        EndpointConfig(type="components.tracker_store.SQLiteLockStore", db=db))
+    assert isinstance(tracker_store, SQLiteTrackerStore)
+    assert isinstance(lock_store, SQLiteLockStore)
+    assert tracker_store.store is lock_store.store
+
+
+def test_save_and_retrieve_round_trip(domain, db):
+    store = TrackerStore.create(
+        EndpointConfig(type="components.tracker_store.SQLiteTrackerStore", db=db), domain)
+    tracker = conversation("alice", domain)
+
+    async def run():
+        await store.save(tracker)
+        return await store.retrieve("alice"), await store.retrieve("nobody"), \
+            list(await store.keys())
+
+    retrieved, missing, keys = asyncio.run(run())
+    assert missing is None
+    assert keys == ["alice"]
+    assert list(retrieved.events) == list(tracker.events)
+    assert retrieved.get_slot("order_id") == "111111"
+    assert retrieved.latest_message.intent["name"] == "track_order"
+
+    # A second store on the file has nothing cached: this read is from disk
+    from_disk = ConversationStore(db).load("alice")
+    assert list(DialogueStateTracker.from_dict("alice", from_disk, domain.slots).events) \
+        == list(tracker.events)
+
+    asyncio.run(store.delete("alice"))
+    assert asyncio.run(store.retrieve("alice")) is None
+
+
+def test_lock_issues_distinct_tickets_and_cleans_up(db):
+    lock_store = LockStore.create(
+        EndpointConfig(type="components.tracker_store.SQLiteLockStore", db=db))
+
+    first = lock_store.issue_ticket("alice")
+    second = lock_store.issue_ticket("alice")
+    assert second == first + 1
+    lock = lock_store.get_lock("alice")
+    assert lock.now_serving == first and lock.is_someone_waiting()
+
+    lock_store.cleanup("alice", first)
+    assert lock_store.get_lock("alice").now_serving == second
+    lock_store.cleanup("alice", second)
+    assert lock_store.get_lock("alice") is None
+
+    async def hold():
+        async with lock_store.lock("bob", wait_time_in_seconds=0.01):
+            # Holding ticket 0 means it is the one now being served
+            assert lock_store.get_lock("bob").is_locked(0) is False
+        return lock_store.get_lock("bob")
+
+    assert asyncio.run(hold()) is None
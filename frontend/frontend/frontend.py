@@ -1,55 +1,72 @@
+import uuid
+
 import reflex as rx
-import httpx
 
-# Replace with your Rasa server URL
-RASA_API_URL = "http://localhost:5005/webhooks/rest/webhook"
+# Rasa server URL, pool size, timeouts and retries are set through RASA_*
+# environment variables (see rasa_client.py)
+from .rasa_client import RasaStatusError, client_lifespan, stream_messages
+
+# Only the newest messages live in the synced state; older ones move to a
+# server-side archive and are paged back in on request
+VISIBLE_MESSAGES = 50
+PAGE_SIZE = 20
+MAX_ARCHIVED = 500
 
 
 class State(rx.State):
     messages: list[dict] = [{"role": "assistant", "content": "Hi! I'm your Earphone Store Assistant. How can I help you?"}]
     new_message: str = ""
     is_loading: bool = False
+    older_count: int = 0
+    
+    # Backend-only vars (never sent to the browser)
+    _archive: list[dict] = []
+    _sender_id: str = ""
+    
+    def _sender(self) -> str:
+        """Rasa sender ID for this browser session, so each user gets their own tracker"""
+        if not self._sender_id:
+            self._sender_id = uuid.uuid4().hex
+        return self._sender_id
+    
+    def _add_message(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+        overflow = len(self.messages) - VISIBLE_MESSAGES
+        if overflow > 0:
+            self._archive.extend(self.messages[:overflow])
+            self.messages = self.messages[overflow:]
+            del self._archive[:-MAX_ARCHIVED]
+        self.older_count = len(self._archive)
+    
+    def load_older(self):
+        """Move the previous page of archived messages back into view"""
+        page = self._archive[-PAGE_SIZE:]
+        del self._archive[-PAGE_SIZE:]
+        self.messages = page + self.messages
+        self.older_count = len(self._archive)
 
     async def send_to_rasa(self):
         if not self.new_message.strip():
             return
         
         # Add user message
-        self.messages.append({"role": "user", "content": self.new_message})
+        self._add_message("user", self.new_message)
         user_msg = self.new_message
         self.new_message = ""
         self.is_loading = True
         yield
         
         try:
-            # Process with Rasa
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    RASA_API_URL,
-                    json={"sender": "user", "message": user_msg},
-                    headers={"Content-Type": "application/json"},
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    rasa_data = response.json()
-                    for msg in rasa_data:
-                        if "text" in msg:
-                            self.messages.append({
-                                "role": "assistant", 
-                                "content": msg["text"]
-                            })
-                else:
-                    self.messages.append({
-                        "role": "assistant", 
-                        "content": f"Server error: {response.status_code}"
-                    })
+            # Process with Rasa, showing each bot message as it arrives
+            async for msg in stream_messages(self._sender(), user_msg):
+                if isinstance(msg, dict) and "text" in msg:
+                    self._add_message("assistant", msg["text"])
+                    yield
         
+        except RasaStatusError as e:
+            self._add_message("assistant", f"Server error: {e.status_code}")
         except Exception as e:
-            self.messages.append({
-                "role": "assistant", 
-                "content": f"Error connecting to server: {str(e)}"
-            })
+            self._add_message("assistant", f"Error connecting to server: {str(e)}")
 
         self.is_loading = False
 
@@ -85,6 +102,16 @@ def index() -> rx.Component:
             
             # Chat messages
             rx.auto_scroll(
+                rx.cond(
+                    State.older_count > 0,
+                    rx.button(
+                        "Load earlier messages",
+                        on_click=State.load_older,
+                        variant="ghost",
+                        size="1",
+                        width="100%",
+                    ),
+                ),
                 rx.foreach(
                     State.messages, 
                     message_bubble
@@ -146,4 +173,5 @@ def index() -> rx.Component:
     )
 
 app = rx.App()
-app.add_page(index)
\ No newline at end of file
+app.add_page(index)
+app.register_lifespan_task(client_lifespan)
\ No newline at end of file
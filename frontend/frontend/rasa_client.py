@@ -0,0 +1,200 @@
+"""
+Shared HTTP client for talking to the Rasa server from the Reflex app
+One pooled keep-alive AsyncClient per process (HTTP/2 when the h2 package
+is installed), retries with backoff on transient failures, a time budget
+per message and latency stats per call
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+logger = logging.getLogger(__name__)
+
+# Rasa server and its REST channel
+RASA_URL = os.environ.get("RASA_URL", "http://localhost:5005")
+WEBHOOK_PATH = "/webhooks/rest/webhook"
+
+# Connection pool
+MAX_CONNECTIONS = int(os.environ.get("RASA_MAX_CONNECTIONS", "200"))
+MAX_KEEPALIVE = int(os.environ.get("RASA_MAX_KEEPALIVE", "50"))
+KEEPALIVE_EXPIRY = float(os.environ.get("RASA_KEEPALIVE_EXPIRY", "30"))
+
+# Timeouts: per phase, and the total budget for one message including retries
+CONNECT_TIMEOUT = float(os.environ.get("RASA_CONNECT_TIMEOUT", "2"))
+READ_TIMEOUT = float(os.environ.get("RASA_READ_TIMEOUT", "10"))
+REQUEST_BUDGET = float(os.environ.get("RASA_REQUEST_BUDGET", "15"))
+
+# Retries for failures before any reply was received
+RETRIES = int(os.environ.get("RASA_RETRIES", "2"))
+RETRY_BACKOFF = float(os.environ.get("RASA_RETRY_BACKOFF", "0.2"))
+# Only 503 (not accepting work). A proxy's 502/504 can come after Rasa ran
+# the turn, and a retry would run it twice
+RETRY_STATUSES = {503}
+
+# Failures raised before the request was sent, so Rasa can't have seen the
+# message. RemoteProtocolError is not among them: it can come after Rasa took
+# the POST, and a retry would process the message twice
+_TRANSIENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RasaStatusError(Exception):
+    """Rasa answered with a non-200 status"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Rasa returned HTTP {status_code}")
+        self.status_code = status_code
+
+
+class CallStats:
+    """Latency of recent calls (time to first message and to completion)"""
+
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self._first = deque(maxlen=window)
+        self._total = deque(maxlen=window)
+
+    def record(self, first: Optional[float], total: float, ok: bool) -> None:
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+        if first is not None:
+            self._first.append(first)
+        self._total.append(total)
+
+    @staticmethod
+    def _percentile(values, q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "first_message_p50_ms": self._percentile(self._first, 0.50),
+            "first_message_p95_ms": self._percentile(self._first, 0.95),
+            "total_p50_ms": self._percentile(self._total, 0.50),
+            "total_p95_ms": self._percentile(self._total, 0.95),
+        }
+
+
+call_stats = CallStats()
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Process-wide client, created on first use in the running event loop"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            base_url=RASA_URL,
+            http2=HTTP2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client() -> None:
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+@contextlib.asynccontextmanager
+async def client_lifespan():
+    """Reflex lifespan task: close pooled connections on shutdown"""
+    yield
+    await close_client()
+
+
+def _timeout(remaining: float) -> httpx.Timeout:
+    # Waiting for a pooled connection is queueing, so it may use the whole budget
+    return httpx.Timeout(
+        connect=min(CONNECT_TIMEOUT, remaining),
+        read=min(READ_TIMEOUT, remaining),
+        write=min(CONNECT_TIMEOUT, remaining),
+        pool=remaining,
+    )
+
+
+async def stream_messages(sender: str, message: str) -> AsyncIterator[Dict[str, Any]]:
+    """Bot messages for one user message, yielded as Rasa streams them
+
+    Connection failures and 503 answers are retried with jittered
+    exponential backoff, but only while nothing has been yielded yet, so a
+    message is never shown twice. Raises RasaStatusError for other non-200
+    answers and httpx.TimeoutException once REQUEST_BUDGET is used up.
+    """
+    start = time.monotonic()
+    deadline = start + REQUEST_BUDGET
+    first = None
+    ok = False
+    try:
+        for attempt in range(RETRIES + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.TimeoutException("Rasa request budget exhausted")
+            try:
+                async with get_client().stream(
+                    "POST",
+                    WEBHOOK_PATH,
+                    params={"stream": "true"},
+                    json={"sender": sender, "message": message},
+                    timeout=_timeout(remaining),
+                ) as response:
+                    if response.status_code != 200:
+                        raise RasaStatusError(response.status_code)
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        if first is None:
+                            first = time.monotonic() - start
+                        payload = json.loads(line)
+                        for item in payload if isinstance(payload, list) else [payload]:
+                            yield item
+                        if time.monotonic() > deadline:
+                            raise httpx.TimeoutException("Rasa request budget exhausted")
+                ok = True
+                return
+            except (RasaStatusError, *_TRANSIENT_ERRORS) as e:
+                retryable = not isinstance(e, RasaStatusError) or e.status_code in RETRY_STATUSES
+                if first is not None or not retryable or attempt == RETRIES:
+                    raise
+                call_stats.retries += 1
+                delay = RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"Rasa call failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+    finally:
+        total = time.monotonic() - start
+        call_stats.record(first, total, ok)
+        logger.debug(f"Rasa call ok={ok} first={first} total={total:.3f}s")
@@ -4,13 +4,33 @@ Database setup script for earphones store chatbot
 Creates SQLite database with sample data for testing
 """
 
-import sqlite3
+import argparse
 import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join("data", "earphones_store.db")
+
+# Indexes on the bulk-loaded tables; dropped before a --scale load and
+# rebuilt afterwards by migrate_database()
+FOREIGN_KEY_INDEXES = {
+    "idx_orders_user": "orders(user_id)",
+    "idx_order_items_order": "order_items(order_id)",
+    "idx_complaints_order": "complaints(order_id)",
+    "idx_complaints_user": "complaints(user_id)",
+}
+
+# Tables whose writes are recorded in change_log for cache invalidation
+CHANGE_LOG_TABLES = ("products", "orders", "users")
 
-def setup_database():
+# Newest change_log entries kept; older ones are deleted as new ones arrive
+CHANGE_LOG_KEEP = 10_000
+
+def setup_database(db_path=DB_PATH):
     # Define paths
-    data_dir = "data"
-    db_path = os.path.join(data_dir, "earphones_store.db")
+    data_dir = os.path.dirname(db_path) or "."
     
     # Create data directory if it doesn't exist
     if not os.path.exists(data_dir):
@@ -27,14 +47,14 @@ def setup_database():
         print(f"Database already exists: {db_path}")
 
 
-def create_database():
+def create_database(db_path=DB_PATH):
     """Create SQLite database with all required tables and sample data"""
     
     # Create database directory if it doesn't exist
     # os.makedirs('data', exist_ok=True)
     
     # Connect to database
-    conn = sqlite3.connect('data/earphones_store.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -186,11 +206,388 @@ def create_database():
         # Commit changes and close connection
         conn.commit()
         print("Database created successfully with sample data!")
-        print("Database location: /workspace/data/earphones_store.db")
+        print(f"Database location: {os.path.abspath(db_path)}")
     conn.close()
+
+
+def migrate_database(db_path=DB_PATH):
+    """Apply schema additions to new and existing databases (idempotent)"""
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
     
+    # Full-text index over product name/brand/tags (external content, so
+    # the text itself is stored only once in the products table)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'")
+    fts_exists = cursor.fetchone() is not None
     
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, brand, tags,
+            content='products',
+            content_rowid='id',
+            tokenize='unicode61',
+            prefix='2 3'
+        )
+    ''')
+    
+    # Keep the index in sync with the products table
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, name, brand, tags)
+            VALUES (new.id, new.name, new.brand, new.tags);
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, brand, tags)
+            VALUES ('delete', old.id, old.name, old.brand, old.tags);
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, brand, tags ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, brand, tags)
+            VALUES ('delete', old.id, old.name, old.brand, old.tags);
+            INSERT INTO products_fts(rowid, name, brand, tags)
+            VALUES (new.id, new.name, new.brand, new.tags);
+        END;
+    ''')
+    
+    if not fts_exists:
+        cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        print("Built full-text product index")
+    
+    # Range scans for price filters, brand lookups and rating-ordered listings
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_brand ON products(brand COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_rating ON products(rating)")
+    
+    # Foreign-key lookups for order tracking and complaints (users.email is
+    # already covered by its UNIQUE index)
+    for name, columns in FOREIGN_KEY_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+    
+    # Normalized tags: one row per distinct tag and one per (product, tag)
+    # pair, so feature filters are index lookups instead of LIKE scans
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='product_tags'")
+    product_tags_exists = cursor.fetchone() is not None
+    
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        );
+        
+        CREATE TABLE IF NOT EXISTS product_tags (
+            product_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, product_id),
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (tag_id) REFERENCES tags (id)
+        ) WITHOUT ROWID;
+        
+        CREATE INDEX IF NOT EXISTS idx_product_tags_product ON product_tags(product_id, tag_id);
+    ''')
+    
+    # Comma-separated tags as a table of values. Triggers can't use CTEs, so
+    # the list is turned into a JSON array (json_quote keeps it valid
+    # whatever the tag text contains)
+    def tag_values(column):
+        return f"json_each('[' || replace(json_quote({column}), ',', '\",\"') || ']')"
+    
+    cursor.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS product_tags_ai AFTER INSERT ON products BEGIN
+            INSERT OR IGNORE INTO tags(name)
+            SELECT lower(trim(value)) FROM {tag_values("new.tags")} WHERE trim(value) != '';
+            INSERT OR IGNORE INTO product_tags(product_id, tag_id)
+            SELECT new.id, t.id FROM {tag_values("new.tags")} j JOIN tags t ON t.name = lower(trim(j.value));
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS product_tags_ad AFTER DELETE ON products BEGIN
+            DELETE FROM product_tags WHERE product_id = old.id;
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS product_tags_au AFTER UPDATE OF tags ON products BEGIN
+            DELETE FROM product_tags WHERE product_id = old.id;
+            INSERT OR IGNORE INTO tags(name)
+            SELECT lower(trim(value)) FROM {tag_values("new.tags")} WHERE trim(value) != '';
+            INSERT OR IGNORE INTO product_tags(product_id, tag_id)
+            SELECT new.id, t.id FROM {tag_values("new.tags")} j JOIN tags t ON t.name = lower(trim(j.value));
+        END;
+    ''')
+    
+    if not product_tags_exists:
+        # Migrate the tags of products already in the database
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO tags(name)
+            SELECT DISTINCT lower(trim(j.value)) FROM products p, {tag_values("p.tags")} j
+            WHERE trim(j.value) != ''
+        ''')
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO product_tags(product_id, tag_id)
+            SELECT p.id, t.id FROM products p, {tag_values("p.tags")} j
+            JOIN tags t ON t.name = lower(trim(j.value))
+        ''')
+        print("Migrated product tags to the tags/product_tags tables")
+    
+    # Every write to a cached table appends (table, row id) here, so
+    # readers can invalidate just the affected cache entries
+    cursor.executescript(f'''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL
+        );
+        
+        CREATE TRIGGER IF NOT EXISTS change_log_trim AFTER INSERT ON change_log BEGIN
+            DELETE FROM change_log WHERE version <= new.version - {CHANGE_LOG_KEEP};
+        END;
+    ''')
+    for table in CHANGE_LOG_TABLES:
+        cursor.executescript(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_change_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO change_log(table_name, row_id) VALUES ('{table}', new.id);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS {table}_change_au AFTER UPDATE ON {table} BEGIN
+                INSERT INTO change_log(table_name, row_id) VALUES ('{table}', new.id);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS {table}_change_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO change_log(table_name, row_id) VALUES ('{table}', old.id);
+            END;
+        ''')
+    
+    conn.commit()
+    conn.close()
+
+
+
+
+# Synthetic data for --scale ------------------------------------------------
+
+# brand -> typical price; actual prices are log-normal around it
+SCALE_BRANDS = {
+    "Sony": 220, "Apple": 230, "Bose": 280, "Sennheiser": 250, "JBL": 80,
+    "Audio-Technica": 150, "Samsung": 150, "Beats": 200, "Anker": 60,
+    "Jabra": 150, "Skullcandy": 50, "Shure": 200, "Beyerdynamic": 250,
+    "AKG": 120, "Bang & Olufsen": 450, "Marshall": 180,
+}
+SCALE_SERIES = ["Pro", "Studio", "Sport", "Air", "Elite", "Tune", "Live", "Pulse",
+                "Quiet", "Bass", "Free", "Momentum", "Flex", "Wave", "Core", "Max"]
+SCALE_FEATURES = ["sports", "waterproof", "bass-boost", "studio", "gaming",
+                  "audiophile", "portable", "foldable", "professional"]
+
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael",
+               "Linda", "William", "Elizabeth", "David", "Barbara", "Richard", "Susan",
+               "Joseph", "Jessica", "Thomas", "Sarah", "Carlos", "Priya", "Wei", "Aisha",
+               "Luca", "Yuki", "Omar", "Sofia", "Noah", "Emma", "Liam", "Olivia"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+              "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson",
+              "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Patel", "Chen",
+              "Kim", "Nguyen", "Rossi", "Muller", "Khan", "Silva", "Sato", "Cohen"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Elm St", "Maple Dr", "Cedar Ln", "Lake Blvd",
+           "Hill Rd", "Park Ave", "River Rd", "Sunset Blvd", "Washington St"]
+CITIES = [("New York", "NY", "100"), ("Los Angeles", "CA", "900"), ("Chicago", "IL", "606"),
+          ("Houston", "TX", "770"), ("Phoenix", "AZ", "850"), ("Seattle", "WA", "981"),
+          ("Denver", "CO", "802"), ("Boston", "MA", "021"), ("Atlanta", "GA", "303"),
+          ("Miami", "FL", "331"), ("Portland", "OR", "972"), ("Austin", "TX", "787")]
+
+COMPLAINT_TOPICS = {
+    "Product Quality": "The {product} stopped working properly after a few days.",
+    "Shipping Delay": "My order has not arrived yet and tracking has not updated.",
+    "Wrong Item": "I received a different model instead of the {product}.",
+    "Damaged Package": "The {product} arrived with a damaged box and scratches.",
+    "Refund Request": "I would like to return the {product} and get a refund.",
+}
+
+# Base sizes for --scale 1; every count is multiplied by the scale factor
+SCALE_PRODUCTS = 2_000
+SCALE_USERS = 250_000
+SCALE_ORDERS = 1_000_000
+COMPLAINT_RATE = 0.02
+
+# All generated timestamps fall in the two years before this date
+SCALE_END_DATE = datetime(2025, 1, 1)
+
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _generate_products(rng, count):
+    for _ in range(count):
+        brand = rng.choice(list(SCALE_BRANDS))
+        price = min(max(rng.lognormvariate(0, 0.45) * SCALE_BRANDS[brand], 15), 1500)
+        price = round(price) - 0.01
+
+        ear = rng.choices(("over-ear", "in-ear", "on-ear"), (0.4, 0.45, 0.15))[0]
+        tags = ["wireless" if rng.random() < 0.8 else "wired", ear]
+        if ear == "in-ear" and tags[0] == "wireless" and rng.random() < 0.6:
+            tags.append("true-wireless")
+        if rng.random() < (0.7 if price > 150 else 0.25):
+            tags.append("noise-cancelling")
+        tags.extend(rng.sample(SCALE_FEATURES, rng.randint(0, 2)))
+        if price < 100:
+            tags.append("budget")
+        elif price >= 300:
+            tags.append("premium")
+
+        name = f"{brand} {rng.choice(SCALE_SERIES)} {rng.choice('ABCEHMQRSX')}{rng.randint(1, 99)}"
+        quantity = 0 if rng.random() < 0.1 else rng.randint(1, 300)
+        rating = round(min(max(rng.gauss(4.2, 0.4), 1.0), 5.0), 1)
+        yield name, brand, price, quantity, rating, ",".join(tags)
+
+
+def _generate_users(rng, first_id, count):
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        city, state, zip_prefix = rng.choice(CITIES)
+        address = (f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {city}, {state} "
+                   f"{zip_prefix}{rng.randint(0, 99):02d}")
+        yield (first_id + i, f"{first} {last}",
+               f"{first}.{last}.{first_id + i}@example.com".lower(), address)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_scale_data(db_path=DB_PATH, scale=1.0, seed=42, batch_size=50_000):
+    """Bulk-load synthetic products, users, orders, order items and complaints
+
+    Runs on top of the sample data from create_database(). The same seed
+    and scale always produce the same rows. Everything is inserted in one
+    transaction with journaling relaxed; the foreign-key indexes are dropped
+    first and rebuilt by migrate_database() once the tables are full.
+    """
+    rng = random.Random(seed)
+    n_products = max(int(SCALE_PRODUCTS * scale), 1)
+    n_users = max(int(SCALE_USERS * scale), 1)
+    n_orders = max(int(SCALE_ORDERS * scale), 1)
+    
+    conn = sqlite3.connect(db_path)
+    for pragma in BULK_LOAD_PRAGMAS:
+        conn.execute(pragma)
+    for name in FOREIGN_KEY_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    # Bulk-loaded rows aren't logged one by one; a row id of 0 below tells
+    # readers the whole table changed
+    for table in CHANGE_LOG_TABLES:
+        for suffix in ("ai", "au", "ad"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_change_{suffix}")
+    
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    
+    cursor.executemany('''
+        INSERT INTO products (name, brand, price, quantity, rating, tags)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', _generate_products(rng, n_products))
+    products = cursor.execute("SELECT id, name, price FROM products").fetchall()
+    
+    first_user = cursor.execute("SELECT coalesce(max(id), 0) + 1 FROM users").fetchone()[0]
+    addresses = []
+    for batch in _batches(_generate_users(rng, first_user, n_users), batch_size):
+        cursor.executemany("INSERT INTO users (id, name, email, address) VALUES (?, ?, ?, ?)", batch)
+        addresses.extend(row[3] for row in batch)
+    
+    first_order = cursor.execute("SELECT coalesce(max(id), 0) + 1 FROM orders").fetchone()[0]
+    span = int(timedelta(days=730).total_seconds())
+    n_complaints = 0
+    for batch_start in range(0, n_orders, batch_size):
+        orders, items, complaints = [], [], []
+        for order_id in range(first_order + batch_start,
+                              first_order + min(batch_start + batch_size, n_orders)):
+            # A minority of customers place most of the orders
+            user_index = int(n_users * rng.random() ** 1.5)
+            created = SCALE_END_DATE - timedelta(seconds=rng.randrange(span))
+            age_days = (SCALE_END_DATE - created).days
+            if rng.random() < 0.05:
+                status = "cancelled"
+            elif age_days < 3:
+                status = "processing"
+            elif age_days < 10:
+                status = "shipped"
+            else:
+                status = "delivered"
+            
+            amount = 0.0
+            for _ in range(rng.choices((1, 2, 3, 4), (0.6, 0.25, 0.1, 0.05))[0]):
+                # Popular products sell far more often than the long tail
+                product_id, product_name, price = products[int(len(products) * rng.random() ** 2)]
+                quantity = 1 if rng.random() < 0.9 else 2
+                items.append((order_id, product_id, quantity, price))
+                amount += price * quantity
+            
+            orders.append((order_id, first_user + user_index, addresses[user_index],
+                           round(amount, 2), status, created.strftime("%Y-%m-%d %H:%M:%S")))
+            
+            if status != "processing" and rng.random() < COMPLAINT_RATE:
+                topic = rng.choice(list(COMPLAINT_TOPICS))
+                complained = created + timedelta(days=rng.randint(3, 30))
+                complaints.append((order_id, first_user + user_index,
+                                   rng.choices(("open", "in-progress", "resolved"), (0.3, 0.2, 0.5))[0],
+                                   topic, COMPLAINT_TOPICS[topic].format(product=product_name),
+                                   complained.strftime("%Y-%m-%d %H:%M:%S")))
+        
+        cursor.executemany('''
+            INSERT INTO orders (id, user_id, shipping_address, order_amount, status, created_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', orders)
+        cursor.executemany('''
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            VALUES (?, ?, ?, ?)
+        ''', items)
+        cursor.executemany('''
+            INSERT INTO complaints (order_id, user_id, status, topic, description, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', complaints)
+        n_complaints += len(complaints)
+    
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'").fetchone():
+        cursor.executemany("INSERT INTO change_log(table_name, row_id) VALUES (?, 0)",
+                           [(table,) for table in CHANGE_LOG_TABLES])
+    conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    print(f"Generated {n_products} products, {n_users} users, {n_orders} orders "
+          f"and {n_complaints} complaints in {time.perf_counter() - start:.1f}s (seed {seed})")
+
+
+def analyze_database(db_path=DB_PATH):
+    """Refresh planner statistics after a bulk load"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create and seed the earphones store database")
+    parser.add_argument("--db", default=DB_PATH, help=f"database file (default {DB_PATH})")
+    parser.add_argument("--scale", type=float, default=0,
+                        help=f"add synthetic data: 1.0 = {SCALE_PRODUCTS} products, "
+                             f"{SCALE_USERS} users, {SCALE_ORDERS} orders")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for --scale")
+    parser.add_argument("--batch-size", type=int, default=50_000,
+                        help="rows per executemany call for --scale")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    setup_database()
-    create_database()
+    args = parse_args()
+    setup_database(args.db)
+    create_database(args.db)
+    if args.scale > 0:
+        generate_scale_data(args.db, args.scale, args.seed, args.batch_size)
+    migrate_database(args.db)
+    if args.scale > 0:
+        analyze_database(args.db)